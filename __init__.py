@@ -1 +1 @@
-__all__ = ["prettyprinter", "format"]
+__all__ = ["prettyprinter", "format", "logformat"]
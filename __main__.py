@@ -0,0 +1,67 @@
+"""Pretty-print JSON or Python literal files:
+
+    python -m prettyprinter [--width N] [--length N] [--level N]
+                            [--lines N] [FILE ...]
+
+Files are memory-mapped and printed as they're scanned, so they may be
+arbitrarily large; standard input is read in its entirety."""
+
+from __future__ import with_statement
+
+import mmap
+import sys
+from argparse import ArgumentParser
+from bindings import bindings
+from literals import pprint_literals
+from prettyprinter import PrettyPrinter, OutputTruncated
+import printervars
+
+def pprint_file(pp, filename):
+    if filename == "-":
+        pprint_literals(pp, sys.stdin.read())
+        return
+    with open(filename, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return              # empty file
+        try:
+            pprint_literals(pp, data)
+        finally:
+            data.close()
+
+def main(argv=None):
+    parser = ArgumentParser(prog="python -m prettyprinter",
+                            description="Pretty-print JSON or Python "
+                                        "literals.")
+    parser.add_argument("files", metavar="FILE", nargs="*", default=["-"],
+                        help="files to print (default: standard input)")
+    parser.add_argument("--width", type=int,
+                        help="right margin (default: terminal width)")
+    parser.add_argument("--length", type=int,
+                        help="maximum number of elements per container")
+    parser.add_argument("--level", type=int,
+                        help="maximum depth of nesting")
+    parser.add_argument("--lines", type=int,
+                        help="maximum number of lines per file")
+    options = parser.parse_args(argv)
+    with bindings(printervars,
+                  print_length=options.length,
+                  print_level=options.level,
+                  print_lines=options.lines):
+        for filename in options.files:
+            pp = PrettyPrinter(sys.stdout, width=options.width)
+            try:
+                pprint_file(pp, filename)
+            except OutputTruncated:
+                pass
+            except (IOError, ValueError), e:
+                sys.stdout.write("\n")
+                print >>sys.stderr, "%s: %s" % (filename, e)
+                return 1
+            pp.terpri()
+            pp.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Limits on the amount of work done by the pretty printer and FORMAT.
+
+A budget is installed by binding printervars.print_budget, e.g.,
+
+    with bindings(printervars, print_budget=Budget(nodes=10000, seconds=0.1)):
+        pprint(obj)
+
+Every object pretty-printed and every list of directives applied counts
+as a node.  When the budget runs out, the output is cut short with an
+ellipsis and all open logical blocks are closed, or, if the budget was
+created with error=True, BudgetExceeded is raised instead.  A budget may
+also be cancelled (e.g., from another thread) at any time."""
+
+from time import time
+
+__all__ = ["Budget", "BudgetExceeded"]
+
+class BudgetExceeded(RuntimeError):
+    pass
+
+class Budget(object):
+    check_interval = 64         # nodes between clock checks
+
+    def __init__(self, nodes=None, seconds=None, error=False):
+        """Allow at most the given number of nodes, and stop at the given
+        number of seconds after the budget is created."""
+        self.nodes = nodes
+        self.deadline = None if seconds is None else time() + seconds
+        self.error = error
+        self.count = 0
+        self.exhausted = None   # reason the budget ran out, if it has
+
+    def cancel(self):
+        """Exhaust the budget immediately."""
+        self.exhausted = "cancelled"
+
+    def charge(self):
+        """Charge the budget for one node.  Return true if it has been
+        exhausted, or raise BudgetExceeded if that's what was asked for."""
+        self.count += 1
+        if self.exhausted is None:
+            if self.nodes is not None and self.count > self.nodes:
+                self.exhausted = "node limit exceeded"
+            elif self.deadline is not None and \
+                    self.count % self.check_interval == 0 and \
+                    time() > self.deadline:
+                self.exhausted = "deadline passed"
+            else:
+                return False
+        if self.error:
+            raise BudgetExceeded(self.exhausted)
+        return True
@@ -1,7 +1,4 @@
 import os
-from array import array
-from fcntl import ioctl
-import termios
 import printervars
 
 class CharposStream(object):
@@ -55,6 +52,10 @@ class CharposStream(object):
         if "COLUMNS" in os.environ:
             return int(os.environ["COLUMNS"])
         try:
+            # Only needed here, so imported here, to speed up startup.
+            from array import array
+            from fcntl import ioctl
+            import termios
             fd = self.stream.fileno()
             winsize = array("H", [0, 0, 0, 0])  # rows, columns, hsize, vsize
             ioctl(1, termios.TIOCGWINSZ, winsize)
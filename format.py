@@ -4,15 +4,15 @@ from __future__ import with_statement
 
 import sys
 from cStringIO import StringIO
-from math import log10
 import re
-import unicodedata
 from bindings import bindings
 from charpos import CharposStream
-from prettyprinter import PrettyPrinter
+from prettyprinter import PrettyPrinter, PrintStream, OutputTruncated, \
+                          printers
+from sinks import iter_output
 import printervars
 
-__all__ = ["Formatter", "format"]
+__all__ = ["Formatter", "formatter", "format", "format_many"]
 
 class FormatError(StandardError):
     def __init__(self, control, *args):
@@ -29,11 +29,12 @@ class FormatParseError(FormatError):
                                                message, args, self.offset,
                                                control, index + self.offset)
 
-class UpAndOut(Exception):
-    pass
-
-class UpUpAndOut(Exception):
-    pass
+# A directive's format method normally returns None.  If an escape (~^ or
+# ~:^) is taken, it returns one of the following statuses instead, which
+# is passed back up through the enclosing directives until it reaches the
+# construct being escaped from.
+up_and_out = 1          # terminate the enclosing ~{...~} step or ~<...~:>
+up_up_and_out = 2       # terminate the entire enclosing ~:{...~}
 
 class Arguments(object):
     """A container for format arguments.  Essentially a read-only list, but
@@ -94,8 +95,14 @@ class Directive(object):
     modifiers_allowed = None
     parameters_allowed = 0
     need_charpos = False
+    need_pprint = False
     need_prettyprinter = False
 
+    # The number of arguments consumed by this directive, if it can be
+    # determined before formatting; None if it depends on the arguments
+    # themselves.  See arg_count, below.
+    consumes = None
+
     def __init__(self, params, colon, atsign,
                  control="", start=0, end=0, parent=None):
         if (colon or atsign) and self.modifiers_allowed is None:
@@ -122,6 +129,17 @@ class Directive(object):
         """Output zero or more arguments to stream."""
         pass
 
+    def arg_count(self):
+        """Return the number of arguments that this directive will consume,
+        or None if that can only be determined at formatting time."""
+        return self.consumes if self.constant_params() else None
+
+    def constant_params(self):
+        """Return true if none of the parameters are V or #."""
+        return not any([p is Directive.variable_parameter or \
+                            p is Directive.remaining_parameter \
+                            for p in self.params])
+
     def param(self, n, args, default=None):
         if n < len(self.params):
             p = self.params[n]
@@ -175,12 +193,29 @@ class DelimitedDirective(Directive):
                                            for c in self.clauses \
                                            for x in c \
                                            if isinstance(x, Directive)])
-        self.need_charpos = self.need_prettyprinter or \
+        self.need_pprint = self.need_prettyprinter or \
+            any([x.need_pprint \
+                     for c in self.clauses \
+                     for x in c \
+                     if isinstance(x, Directive)])
+        self.need_charpos = self.need_pprint or \
             any([x.need_charpos \
                      for c in self.clauses \
                      for x in c \
                      if isinstance(x, Directive)])
 
+def arg_count(directives):
+    """Return the total number of arguments consumed by a sequence of
+    directives, or None if it can't be determined statically."""
+    n = 0
+    for x in directives:
+        if isinstance(x, Directive):
+            m = x.arg_count()
+            if m is None:
+                return None
+            n += m
+    return n
+
 # Basic Output
 
 ascii_control_chars = {
@@ -202,9 +237,14 @@ python_escapes = {
 
 class Character(Directive):
     modifiers_allowed = Modifiers.all
+    consumes = 1
 
     def format(self, stream, args):
-        char = unicode(args.next())
+        self.emit(stream, args.next())
+
+    def emit(self, stream, arg):
+        import unicodedata      # seldom needed, and slow to import
+        char = unicode(arg)
         if len(char) != 1:
             raise TypeError("expected single character")
         if self.atsign:
@@ -236,6 +276,7 @@ class ConstantChar(Directive):
 
     modifiers_allowed = None
     parameters_allowed = 1
+    consumes = 0
 
     def __new__(cls, params, colon, atsign, *args):
         if colon or atsign:
@@ -249,6 +290,9 @@ class ConstantChar(Directive):
             return super(ConstantChar, cls).__new__(cls, params, colon, atsign,
                                                     *args)
 
+    def __getnewargs__(self):
+        return (self.params, self.colon, self.atsign)
+
     def format(self, stream, args):
         stream.write(self.character * self.param(0, args, 1))
 
@@ -257,6 +301,7 @@ class Newline(ConstantChar):
 
 class FreshLine(Directive):
     need_charpos = True
+    consumes = 0
 
     def format(self, stream, args):
         n = self.param(0, args, 1)
@@ -280,15 +325,80 @@ class Tilde(ConstantChar):
 
 digits = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
 
+radix_formats = {8: "%o", 16: "%X"}
+
 def convert(n, radix):
-    """Yield the digits of the non-negative integer n in the given radix."""
-    def le_digits(n, radix):
-        while n > 0:
-            yield digits[n % radix]
-            n /= radix
+    """Return a string containing the digits of the non-negative integer n
+    in the given radix.
+
+    Radices 2, 8, 10, and 16 use the built-in conversions.  Others are
+    converted by divide-and-conquer: n is split in half by a division by
+    radix**(2**k), and the halves are converted recursively.  This does
+    the bulk of the work in a few large divisions instead of a long run
+    of small ones, each of which takes time proportional to the size of
+    n."""
     if radix < 2 or radix > 36:
         raise ValueError("radix out of range")
-    return reversed(tuple(le_digits(n, radix)))
+    if isinstance(n, float):
+        n = int(n)
+    if radix in radix_formats:
+        return radix_formats[radix] % n
+    elif radix == 2:
+        return bin(n)[2:]
+    elif radix == 10:
+        return "%d" % n
+    else:
+        return split_convert(n, radix)
+
+def split_convert(n, radix):
+    """Convert n to the given radix by divide-and-conquer."""
+    # powers[k] = radix**(2**k); the last is the largest not exceeding
+    # the square root of n.
+    powers = [radix]
+    while powers[-1] <= n // powers[-1]:
+        powers.append(powers[-1] * powers[-1])
+    chunks = []
+    def split(n, k, width):
+        """Append the digits of n < powers[k+1] to chunks, zero-padded on
+        the left to the given width."""
+        if k < 6:
+            chunks.append(small_convert(n, radix).rjust(width, "0"))
+        else:
+            (q, r) = divmod(n, powers[k])
+            if q or width:
+                split(q, k - 1, max(width - (1 << k), 0))
+                split(r, k - 1, 1 << k)
+            else:
+                split(r, k - 1, 0)
+    split(n, len(powers) - 1, 0)
+    return "".join(chunks)
+
+def small_convert(n, radix):
+    """Return the digits of a (relatively) small integer n."""
+    if radix == 10:
+        return "%d" % n
+    elif n == 0:
+        return "0"
+    a = []
+    while n > 0:
+        (n, d) = divmod(n, radix)
+        a.append(digits[d])
+    a.reverse()
+    return "".join(a)
+
+def commafy(s, commachar, comma_interval):
+    """Add commachars between groups of comma_interval digits."""
+    first = len(s) % comma_interval or comma_interval
+    return commachar.join([s[:first]] +
+                          [s[i:i + comma_interval] \
+                               for i in xrange(first, len(s), comma_interval)])
+
+def zero_pad_width(mincol, sign, comma_interval):
+    """Return the largest number of digits w such that, after inserting
+    a comma between every group of comma_interval digits and prepending
+    sign, w digits will fit in mincol columns."""
+    m = mincol - len(sign)
+    return m - m // (comma_interval + 1)
 
 roman_numerals = ["M", 2, "D", 5, "C", 2, "L", 5, "X", 2, "V", 5, "I"]
 
@@ -369,25 +479,37 @@ def itoe(n, ordinal):
                 return s + tenstems[n/10] + \
                     (tsuff0 if ones == 0 else (tsuff1 + "-" + table[ones]))
 
-    v = int(log10(n)) / 3
-    u = 1000 ** v
-    while v >= 0:
-        q = n / u
-        if q != 0:
-            s += itoe(q, ordinal and n < 1000)
-            if v >= len(ten_cubes):
-                s += " times ten to the %s power plus" % (itoo(3*v))
-            elif ten_cubes[v]:
-                s += " " + ten_cubes[v]
-            n %= u
-            if n == 0:
-                if v > 0: s += osuff
-            else:
-                if n >= 100 and v < len(ten_cubes): s += ","
-                s += " "
-        v -= 1
-        u /= 1000
-    return s
+    # Split the decimal representation into groups of three digits, most
+    # significant first.  We also need to know, for each group, the value
+    # of the groups that follow it (or at least whether that's zero or
+    # more than 100).
+    d = convert(n, 10)
+    first = len(d) % 3 or 3
+    groups = [int(d[:first])] + \
+             [int(d[i:i+3]) for i in xrange(first, len(d), 3)]
+    last = len(groups) - 1
+    rests = [0] * len(groups)
+    for i in xrange(last, 0, -1):
+        q = groups[i]
+        rests[i-1] = rests[i] if q == 0 else q if i == last else 1000
+
+    words = [s]
+    for (i, q) in enumerate(groups):
+        if q == 0:
+            continue
+        v = last - i
+        words.append(itoe(q, ordinal and v == 0))
+        if v >= len(ten_cubes):
+            words.append(" times ten to the %s power plus" % itoo(3*v))
+        elif ten_cubes[v]:
+            words.append(" " + ten_cubes[v])
+        if rests[i] == 0:
+            if v > 0: words.append(osuff)
+            break
+        else:
+            if rests[i] >= 100 and v < len(ten_cubes): words.append(",")
+            words.append(" ")
+    return "".join(words)
 
 def itoo(n):
     return itoe(n, True)
@@ -400,16 +522,24 @@ class Numeric(Directive):
 
     modifiers_allowed = Modifiers.all
     parameters_allowed = 4
+    consumes = 1
 
     def format(self, stream, args):
-        def commafy(s, commachar, comma_interval):
-            """Add commachars between groups of comma_interval digits."""
-            first = len(s) % comma_interval
-            a = [s[0:first]] if first > 0 else []
-            for i in range(first, len(s), comma_interval):
-                a.append(s[i:i + comma_interval])
-            return commachar.join(a)
+        params = self.numeric_params(args)
+        n = args.next()
+        with bindings(printervars,
+                      print_escape=False,
+                      print_radix=False,
+                      print_base=params[0],
+                      print_readably=False):
+            stream.write(self.format_number(n, *params))
 
+    def emit(self, stream, arg):
+        stream.write(self.format_number(arg, *self.numeric_params(None)))
+
+    def numeric_params(self, args):
+        """Return a tuple (radix, mincol, padchar, commachar, comma_interval)
+        of parameter values."""
         i = 0
         if self.radix:
             radix = self.radix
@@ -419,44 +549,36 @@ class Numeric(Directive):
         padchar = str(self.param(i, args, " ")); i += 1
         commachar = str(self.param(i, args, ",")); i += 1
         comma_interval = int(self.param(i, args, 3)); i += 1
-
-        n = args.next()
+        return (radix, mincol, padchar, commachar, comma_interval)
+
+    def formatter(self):
+        """Return a function of one argument that produces the string that
+        this directive would output for it, or None if any of the parameters
+        must be taken from the arguments."""
+        if not self.constant_params():
+            return None
+        params = self.numeric_params(None)
+        return lambda n: self.format_number(n, *params)
+
+    def format_number(self, n, radix, mincol, padchar, commachar,
+                      comma_interval):
         s = self.convert(abs(n), radix)
         sign = ("+" if n >= 0 else "-") if self.atsign else \
                ("-" if n < 0 else "")
         if self.colon:
             if padchar == "0" and mincol > len(s) + len(sign):
                 # We pad with zeros first so that they can be commafied,
-                # too (cf. CLiki Issue FORMAT-RADIX-COMMACHAR).  But in
-                # order to figure out how many to add, we need to solve a
-                # little constraint problem.
-                def col(n):
-                    return n + (n-1)/comma_interval + len(sign)
-                width = -1
-                for i in range(len(s), mincol):
-                    if col(i) == mincol:
-                        # exact fit
-                        width = i
-                        break
-                    elif col(i) > mincol:
-                        # too big
-                        width = i - 1
-                        break
-                assert width > 0, "couldn't find a width"
-                s = s.rjust(width, padchar)
-
-                # If we're printing a sign, and the width that we chose
-                # above is a multiple of comma_interval, we'll need (at
-                # most one) extra space to get up to mincol.
+                # too (cf. CLiki Issue FORMAT-RADIX-COMMACHAR).  If we're
+                # printing a sign, and the width that we choose is a
+                # multiple of comma_interval, we'll need (at most one)
+                # extra space to get up to mincol.
+                s = s.rjust(zero_pad_width(mincol, sign, comma_interval), "0")
                 padchar = " "
-
             s = commafy(s, commachar, comma_interval)
-        with bindings(printervars,
-                      print_escape=False,
-                      print_radix=False,
-                      print_base=radix,
-                      print_readably=False):
-            stream.write((sign + s).rjust(mincol, padchar))
+        return (sign + s).rjust(mincol, padchar)
+
+    def convert(self, n, radix):
+        return convert(n, radix)
 
 class Radix(Numeric):
     parameters_allowed = 5
@@ -465,57 +587,53 @@ class Radix(Numeric):
     def __init__(self, *args):
         super(Radix, self).__init__(*args)
         if not self.params:
-            self.format = self.old_roman if self.colon and self.atsign \
-                                         else self.roman if self.atsign \
-                                         else self.ordinal if self.colon \
-                                         else self.cardinal
+            self.words = self.old_roman if self.colon and self.atsign \
+                                        else self.roman if self.atsign \
+                                        else itoo if self.colon \
+                                        else itoc
+            self.format = self.format_words
+            self.emit = self.emit_words
 
-    def convert(self, n, radix):
-        return "".join(convert(n, radix))
+    def formatter(self):
+        return self.words if not self.params \
+                          else super(Radix, self).formatter()
 
-    def roman(self, stream, args):
-        stream.write("".join(roman_int(args.next())))
+    def format_words(self, stream, args):
+        self.emit_words(stream, args.next())
 
-    def old_roman(self, stream, args):
-        stream.write("".join(roman_int(args.next(), True)))
+    def emit_words(self, stream, arg):
+        stream.write(self.words(arg))
 
-    def ordinal(self, stream, args):
-        stream.write(itoo(args.next()))
+    def roman(self, n):
+        return "".join(roman_int(n))
 
-    def cardinal(self, stream, args):
-        stream.write(itoc(args.next()))
+    def old_roman(self, n):
+        return "".join(roman_int(n, True))
 
 class Decimal(Numeric):
     radix = 10
-    def convert(self, n, radix):
-        return "%d" % n
-
-octal_digits = ["000", "001", "010", "011", "100", "101", "110", "111"]
 
 class Binary(Numeric):
     radix = 2
-    def convert(self, n, radix):
-        return "".join(octal_digits[int(digit)] \
-                           for digit in "%o" % n).lstrip("0")
 
 class Octal(Numeric):
     radix = 8
-    def convert(self, n, radix):
-        return "%o" % n
 
 class Hexadecimal(Numeric):
     radix = 16
-    def convert(self, n, radix):
-        return "%X" % n
-
+
 # Printer Operations
 
 class Padded(Directive):
     modifiers_allowed = Modifiers.all
     parameters_allowed = 4
-    need_prettyprinter = True
+    need_pprint = True
+    consumes = 1
 
     def format(self, stream, args):
+        self.emit(stream, args.next(), args)
+
+    def emit(self, stream, arg, args=None):
         def pad(s):
             mincol = self.param(0, args, 0)
             colinc = self.param(1, args, 1)
@@ -529,24 +647,24 @@ class Padded(Directive):
             return s.rjust(mincol, padchar) if self.atsign else \
                    s.ljust(mincol, padchar)
 
-        arg = args.next()
         stream.pprint("[]" if self.colon and arg is None \
                            else pad(format(None, "~W", arg)) if self.params \
                            else arg)
 
 class Aesthetic(Padded):
-    def format(self, stream, args):
+    def emit(self, stream, arg, args=None):
         with bindings(printervars, print_escape=None):
-            super(Aesthetic, self).format(stream, args)
+            super(Aesthetic, self).emit(stream, arg, args)
 
 class Standard(Padded):
-    def format(self, stream, args):
+    def emit(self, stream, arg, args=None):
         with bindings(printervars, print_escape=True):
-            super(Standard, self).format(stream, args)
+            super(Standard, self).emit(stream, arg, args)
 
 class Write(Directive):
     modifiers_allowed = Modifiers.all
-    need_prettyprinter = True
+    need_pprint = True
+    consumes = 1
 
     def __init__(self, *args):
         super(Write, self).__init__(*args)
@@ -558,19 +676,27 @@ class Write(Directive):
                 self.bindings["print_level"] = None
                 self.bindings["print_length"] = None
             self.format = self.format_with_bindings
+            self.emit = self.emit_with_bindings
 
     def format(self, stream, args):
         stream.pprint(args.next())
 
     def format_with_bindings(self, stream, args):
+        self.emit_with_bindings(stream, args.next())
+
+    def emit(self, stream, arg):
+        stream.pprint(arg)
+
+    def emit_with_bindings(self, stream, arg):
         with bindings(printervars, **self.bindings):
-            stream.pprint(args.next())
+            stream.pprint(arg)
 
 # Pretty Printer Operations
 
 class ConditionalNewline(Directive):
     modifiers_allowed = Modifiers.all
     need_prettyprinter = True
+    consumes = 0
 
     def format(self, stream, args):
         stream.newline(mandatory=(self.colon and self.atsign), fill=self.colon)
@@ -598,6 +724,7 @@ class LogicalBlock(DelimitedDirective):
 
     def delimited(self):
         super(LogicalBlock, self).delimited()
+        self.need_prettyprinter = self.need_pprint = self.need_charpos = True
 
         # Note: with the colon modifier, the prefix & suffix default to
         # square, not round brackets; this is Python, not Lisp.
@@ -616,25 +743,31 @@ class LogicalBlock(DelimitedDirective):
         self.per_line = self.separators and self.separators[0].atsign
 
         if self.delimiter.atsign:
-            self.body = fill_paragraph(self.body)
+            self.body = list(fill_paragraph(self.body))
+
+    def arg_count(self):
+        return None if self.atsign else 1
 
     def format(self, stream, args):
+        return self.emit(stream,
+                         args if self.atsign else Arguments(args.next()))
+
+    def emit(self, stream, arg):
         with stream.logical_block(None,
                                   prefix=str(self.prefix),
                                   per_line=self.per_line,
                                   suffix=str(self.suffix)):
-            try:
-                apply_directives(stream,
-                                 self.body,
-                                 args if self.atsign \
-                                      else Arguments(args.next()))
-            except UpAndOut:
-                pass
+            status = apply_directives(stream, self.body,
+                                      arg if isinstance(arg, Arguments) \
+                                          else Arguments(arg))
+            if status == up_up_and_out:
+                return status
 
 class Indentation(Directive):
     modifiers_allowed = Modifiers.colon
     parameters_allowed = 1
     need_prettyprinter = True
+    consumes = 0
 
     def format(self, stream, args):
         stream.indent(offset=int(self.param(0, args, 0)), relative=self.colon)
@@ -645,6 +778,7 @@ class Tabulate(Directive):
     modifiers_allowed = Modifiers.all
     parameters_allowed = 2
     need_charpos = True
+    consumes = 0
 
     def format(self, stream, args):
         def ceiling(a, b):
@@ -734,12 +868,31 @@ class Conditional(DelimitedDirective):
                     any([s.colon for s in self.separators[0:-1]]):
                 raise FormatError("only the last ~~; may have a colon")
 
+    def arg_count(self):
+        # We can only count the arguments if every clause consumes the
+        # same number of them (including the empty "clause" selected by
+        # an out-of-range index when there's no default clause).
+        counts = set([arg_count(clause) for clause in self.clauses])
+        if len(counts) != 1 or self.atsign or not self.constant_params():
+            return None
+        (n,) = counts
+        if n is None:
+            return None
+        elif self.colon:
+            return 1 + n
+        elif n == 0 or (self.separators and self.separators[-1].colon):
+            return (0 if self.params else 1) + n
+        else:
+            return None
+
     def format(self, stream, args):
         if self.colon:
             # "~:[ALTERNATIVE~;CONSEQUENT~] selects the ALTERNATIVE control
             # string if arg is false, and selects the CONSEQUENT control
             # string otherwise."
-            apply_directives(stream, self.clauses[1 if args.next() else 0], args)
+            return apply_directives(stream,
+                                    self.clauses[1 if args.next() else 0],
+                                    args)
         elif self.atsign:
             # "~@[CONSEQUENT~] tests the argument.  If it is true, then
             # the argument is not used up by the ~[ command but remains
@@ -747,20 +900,20 @@ class Conditional(DelimitedDirective):
             # CONSEQUENT is processed.  If the arg is false, then the
             # argument is used up, and the clause is not processed."
             if args.peek():
-                apply_directives(stream, self.clauses[0], args)
+                return apply_directives(stream, self.clauses[0], args)
             else:
                 args.next()
         else:
             try:
                 n = self.param(0, args)
                 if n is None: n = args.next()
-                apply_directives(stream, self.clauses[n], args)
+                return apply_directives(stream, self.clauses[n], args)
             except IndexError:
                 if self.separators[-1].colon:
                     # "If the last ~; used to separate clauses is ~:;
                     # instead, then the last clause is an 'else' clause
                     # that is performed if no other clause is selected."
-                    apply_directives(stream, self.clauses[-1], args)
+                    return apply_directives(stream, self.clauses[-1], args)
 
 class EndIteration(Directive):
     modifiers_allowed = Modifiers.colon
@@ -779,16 +932,47 @@ class Iteration(DelimitedDirective):
         body = self.clauses[0]
         self.need_prettyprinter = not body or \
             any([x.need_prettyprinter for x in body if isinstance(x, Directive)])
-        self.need_charpos = self.need_prettyprinter or \
+        self.need_pprint = self.need_prettyprinter or \
+            any([x.need_pprint for x in body if isinstance(x, Directive)])
+        self.need_charpos = self.need_pprint or \
             any([x.need_charpos for x in body if isinstance(x, Directive)])
         self.prepared = body and prepare_directives(body)
+        self.batch = body and not self.colon and batch_directives(body)
+
+    def __getstate__(self):
+        # The batch function is a closure, and so can't be pickled.
+        state = self.__dict__.copy()
+        state.pop("batch", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "prepared" in state:
+            body = self.clauses[0]
+            self.batch = body and not self.colon and batch_directives(body)
+
+    def arg_count(self):
+        if self.atsign or not self.constant_params():
+            return None
+        return 1 if self.prepared else 2
 
     def format(self, stream, args):
         max = self.param(0, args, -1)
         body = self.prepared or \
-            prepare_directives(parse_control_string(args.next()))
-
-        args = args if self.atsign else Arguments(args.next())
+            prepare_directives(formatter(args.next()).directives)
+        self.iterate(stream, body, max,
+                     args if self.atsign else Arguments(args.next()))
+
+    def emit(self, stream, arg):
+        self.iterate(stream, self.prepared, self.param(0, None, -1),
+                     Arguments(arg))
+
+    def iterate(self, stream, body, max, args):
+        if self.batch and not args.empty and \
+                printervars.print_budget is None:
+            # The batch doesn't charge the budget for each iteration.
+            self.batch(stream, args, max)
+            return
         next = (lambda args: Arguments(args.next(), args)) if self.colon \
                                                            else None
         write = stream.write
@@ -796,23 +980,106 @@ class Iteration(DelimitedDirective):
         while not args.empty or (i == 0 and self.delimiter.colon):
             if i == max: break
             i += 1
-            try:
-                iargs = next(args) if next else args
-                fast_apply_directives(stream, write, body, iargs)
-            except UpAndOut:
-                continue
-            except UpUpAndOut:
+            iargs = next(args) if next else args
+            if fast_apply_directives(stream, write, body, iargs) == \
+                    up_up_and_out:
                 break
 
+def batch_directives(body):
+    """If the body of an iteration consists solely of literal strings,
+    numeric directives with constant parameters, and parameterless ~^
+    directives, return a function that formats all of the remaining
+    arguments in a single pass and writes the result to the stream all
+    at once.  Otherwise, return None."""
+    plan = []
+    for x in body:
+        if isinstance(x, basestring):
+            plan.append(x)
+        elif isinstance(x, Numeric):
+            f = x.formatter()
+            if f is None:
+                return None
+            plan.append(f)
+        elif isinstance(x, Escape) and not x.colon and not x.params:
+            plan.append(None)
+        else:
+            return None
+
+    k = len([x for x in plan if callable(x)])
+    if k == 0:
+        return None
+
+    def values(args, max):
+        """Consume and return the arguments for at most max iterations."""
+        seq = args.args
+        start = args.cur
+        stop = args.len if max < 0 else min(args.len, start + max*k)
+        args.cur = stop
+        args.empty = (stop == args.len)
+        if start > 0 or stop < len(seq):
+            seq = seq[start:stop]
+        if hasattr(seq, "tolist"):
+            # array.array, numpy.ndarray: convert only what's used.
+            seq = seq.tolist()
+        return seq
+
+    if k == 1:
+        # The common case: each iteration consumes exactly one argument,
+        # so the whole output is just a join.  A ~^ before the numeric
+        # directive is a no-op, since an iteration only begins if there
+        # are arguments remaining; one after it is only ever taken after
+        # the last argument.
+        i = [callable(x) for x in plan].index(True)
+        f = plan[i]
+        pre = "".join([x for x in plan[:i] if x])
+        rest = plan[i+1:]
+        escape = None in rest
+        j = rest.index(None) if escape else len(rest)
+        mid = "".join(rest[:j])
+        post = "".join([x for x in rest[j:] if x])
+        def batch(stream, args, max):
+            v = values(args, max)
+            if not v:
+                return
+            last = mid if escape and args.empty else mid + post
+            stream.write(pre + (mid + post + pre).join(map(f, v)) + last)
+    else:
+        def batch(stream, args, max):
+            v = values(args, max)
+            n = len(v)
+            out = []
+            append = out.append
+            pos = 0
+            while pos < n:
+                for x in plan:
+                    if x is None:
+                        if pos == n and args.empty:
+                            break
+                    elif isinstance(x, basestring):
+                        append(x)
+                    elif pos == n:
+                        # Ran out of arguments in the middle of the body.
+                        stream.write("".join(out))
+                        raise StopIteration
+                    else:
+                        append(x(v[pos]))
+                        pos += 1
+            stream.write("".join(out))
+    return batch
+
 class Recursive(Directive):
     modifiers_allowed = Modifiers.atsign
     need_charpos = True
     need_prettyprinter = True
 
+    def arg_count(self):
+        return None if self.atsign else 2
+
     def format(self, stream, args):
-        apply_directives(stream,
-                         parse_control_string(args.next()),
-                         args if self.atsign else Arguments(args.next()))
+        return apply_directives(stream,
+                                formatter(args.next()).directives,
+                                args if self.atsign \
+                                     else Arguments(args.next()))
 
 # Miscellaneous Operations
 
@@ -826,35 +1093,50 @@ class CaseConversion(DelimitedDirective):
     def delimited(self):
         super(CaseConversion, self).delimited()
         self.body = self.clauses[0]
+        self.formatter = Formatter(self.body)
+
+    def arg_count(self):
+        return arg_count(self.body)
 
     def format(self, stream, args):
         stringstream = StringIO()
         try:
-            Formatter(self.body)(stringstream, args)
+            status = self.formatter(stringstream, args)
             s = stringstream.getvalue()
         finally:
             stringstream.close()
+        if status:
+            return status       # an escape discards the converted text
 
         stream.write(s.upper() if self.colon and self.atsign \
                                else s.title() if self.colon \
                                else s.capitalize() if self.atsign \
                                else s.lower())
 
+def previous_arg(args): return args.peek(-1)
+def next_arg(args): return args.next()
+def plural_y(arg): return "y" if arg == 1 else "ies"
+def plural_s(arg): return "" if arg == 1 else "s"
+
 class Plural(Directive):
     modifiers_allowed = Modifiers.all
+    consumes = 1
 
     def __init__(self, *args):
-        def prev(args): return args.peek(-1)
-        def next(args): return args.next()
-        def y(arg): return "y" if arg == 1 else "ies"
-        def s(arg): return "" if arg == 1 else "s"
-
         super(Plural, self).__init__(*args)
-        self.arg = prev if self.colon else next
-        self.suffix = y if self.atsign else s
+        self.arg = previous_arg if self.colon else next_arg
+        self.suffix = plural_y if self.atsign else plural_s
+
+    def arg_count(self):
+        # ~:P backs up, which we can't express as a count; but see
+        # Formatter.plan.
+        return None if self.colon else 1
 
     def format(self, stream, args):
         stream.write(self.suffix(self.arg(args)))
+
+    def emit(self, stream, arg):
+        stream.write(self.suffix(arg))
 
 # Miscellaneous Pseudo-Operations
 
@@ -873,7 +1155,7 @@ class Escape(Directive):
             if not (iteration and iteration.colon):
                 raise FormatError("can't have ~~:^ outside of a "
                                   "~~:{...~~} construct")
-        self.exception = UpUpAndOut if self.colon else UpAndOut
+        self.status = up_up_and_out if self.colon else up_and_out
 
         if len(self.params) == 0:
             self.format = self.check_remaining_outer if self.colon \
@@ -883,11 +1165,11 @@ class Escape(Directive):
 
     def check_remaining(self, stream, args):
         if args.empty:
-            raise UpAndOut()
+            return up_and_out
 
     def check_remaining_outer(self, stream, args):
         if args.outer.empty:
-            raise UpUpAndOut()
+            return up_up_and_out
 
     def check_params(self, stream, args):
         # This could be split up, too.
@@ -895,126 +1177,151 @@ class Escape(Directive):
         if (param3 is not None and param1 <= param2 and param2 <= param3) or \
            (param2 is not None and param1 == param2) or \
            (param1 is not None and param1 == 0):
-            raise self.exception()
+            return self.status
 
-format_directives = dict()
+# Directive classes, indexed by directive character (in both cases).
+format_directives = {
+    "C": Character, "c": Character, "%": Newline, "&": FreshLine,
+    "|": Page, "~": Tilde,
+    "R": Radix, "r": Radix, "D": Decimal, "d": Decimal,
+    "B": Binary, "b": Binary, "O": Octal, "o": Octal,
+    "X": Hexadecimal, "x": Hexadecimal,
+    "A": Aesthetic, "a": Aesthetic, "S": Standard, "s": Standard,
+    "W": Write, "w": Write,
+    "_": ConditionalNewline, "I": Indentation, "i": Indentation,
+    "T": Tabulate, "t": Tabulate, "<": Justification, ">": EndJustification,
+    "*": GoTo, "[": Conditional, "]": EndConditional,
+    "{": Iteration, "}": EndIteration, "?": Recursive,
+    "(": CaseConversion, ")": EndCaseConversion, "P": Plural, "p": Plural,
+    ";": Separator, "^": Escape,
+}
 
 def register_directive(char, cls):
     assert len(char) == 1, "only single-character directives allowed"
     assert issubclass(cls, Directive), "invalid format directive class"
     format_directives[char.upper()] = format_directives[char.lower()] = cls
 
-map(lambda x: register_directive(*x), {
-    "C": Character, "%": Newline, "&": FreshLine, "|": Page, "~": Tilde,
-    "R": Radix, "D": Decimal, "B": Binary, "O": Octal, "X": Hexadecimal,
-    "A": Aesthetic, "S": Standard, "W": Write,
-    "_": ConditionalNewline, "I": Indentation,
-    "T": Tabulate, "<": Justification, ">": EndJustification,
-    "*": GoTo, "[": Conditional, "]": EndConditional,
-    "{": Iteration, "}": EndIteration, "?": Recursive,
-    "(": CaseConversion, ")": EndCaseConversion, "P": Plural,
-     ";": Separator, "^": Escape,
-}.items())
+# The regular expressions for control strings are compiled on first use,
+# since many programs import this module but never parse one.
+control_syntax = None
+parameter_syntax = None
+
+def compile_syntax():
+    global control_syntax, parameter_syntax
+    # control_syntax is what parse_control_string checks, so it must be
+    # assigned last, for the sake of other threads.
+    parameter_syntax = re.compile(r"([+-]?\d+|'.|[Vv#]),?|,", re.DOTALL)
+    control_syntax = re.compile(r"""
+        ([^~]+)                             # 1: literal text
+      | ~((?:[+-]?\d+,?|'.,?|[Vv\#],?|,)*)  # 2: directive parameters
+         ([:@]*)                            # 3: modifiers
+         (.)?                               # 4: directive character
+    """, re.VERBOSE | re.DOTALL)
+
+special_parameters = {"V": Directive.variable_parameter,
+                      "v": Directive.variable_parameter,
+                      "#": Directive.remaining_parameter}
+
+parsed_params = {}
+
+def parse_params(params):
+    """Parse the (syntactically valid) parameters of a directive."""
+    try:
+        return list(parsed_params[params])
+    except KeyError:
+        pass
+    parsed = []
+    for p in parameter_syntax.findall(params):
+        if not p:
+            parsed.append(None)
+        elif p[0] == "'":
+            parsed.append(p[1])
+        elif p in special_parameters:
+            parsed.append(special_parameters[p])
+        else:
+            parsed.append(int(p))
+    if len(parsed_params) < 1000:
+        parsed_params[params] = tuple(parsed)
+    return parsed
 
-def parse_control_string(control, start=0, parent=None):
-    """Yield a list of strings and Directive instances corresponding to the
+def parse_control_string(control, start=0):
+    """Return a list of strings and Directive instances corresponding to the
     given control string."""
 
     assert isinstance(control, basestring), "control string must be a string"
     assert start >= 0, "can't start parsing from end"
+    if control_syntax is None:
+        compile_syntax()
+    return parse_directives(control, start)
+
+def parse_directives(control, start):
+    directives = []
+    stack = []                  # open delimited directives & their ends
+
+    def add(x):
+        # Add a string or complete directive to the innermost open
+        # delimited directive, closing it (and adding it to its parent)
+        # if x is its delimiter.
+        while stack:
+            (d, i) = stack[-1]
+            try:
+                d.append(x)
+            except FormatError, e:
+                if isinstance(x, Directive) and x is not d.delimiter:
+                    i += x.start
+                raise FormatParseError(control, i, e.control, *e.args)
+            if x is not d.delimiter:
+                return
+            stack.pop()
+            x = d
+        directives.append(x)
+
+    for m in control_syntax.finditer(control, start):
+        (text, params, modifiers, char) = m.groups()
+        if text:
+            if stack:
+                add(text)
+            else:
+                directives.append(text)
+            continue
 
-    i = start
-    end = len(control)
-    while i < end:
-        tilde = control.find("~", i)
-        if tilde == -1:
-            yield control[i:end]
-            break
-        elif tilde > i:
-            yield control[i:tilde]
-        i = tilde + 1
-
-        params = []
-        while i < end:
-            # empty parameter
-            if control[i] == ",":
-                params.append(None)
-                i += 1
-                continue
-
-            # numeric parameter
-            mark = i
-            if control[i] in "+-":
-                i += 1
-            while i < end and control[i].isdigit():
-                i += 1
-            if i > mark:
-                params.append(int(control[mark:i]))
-                if control[i] == ",":
-                    i += 1
-                continue
-
-            # character parameter
-            if control[i] == "'":
-                params.append(control[i+1])
-                i += 2
-                if control[i] == ",":
-                    i += 1
-                continue
-
-            # "variable" parameter
-            if control[i] in "Vv":
-                params.append(Directive.variable_parameter)
-                i += 1
-                if control[i] == ",":
-                    i += 1
-                continue
-
-            # "remaining" parameter
-            if control[i] == "#":
-                params.append(Directive.remaining_parameter)
-                i += 1
-                if control[i] == ",":
-                    i += 1
-                continue
-            break
-
+        i = m.end()
+        params = parse_params(params) if params else []
         colon = atsign = False
-        while i < end:
-            if control[i] == ":":
-                i += 1
-                if colon:
-                    raise FormatParseError(control, i, "too many colons")
-                colon = True
-            elif control[i] == "@":
-                i += 1
-                if atsign:
-                    raise FormatParseError(control, i, "too many at-signs")
-                atsign = True
-            else:
-                break
+        if modifiers:
+            for (j, modifier) in enumerate(modifiers):
+                if modifier == ":":
+                    if colon:
+                        raise FormatParseError(control, m.start(3) + j + 1,
+                                               "too many colons")
+                    colon = True
+                else:
+                    if atsign:
+                        raise FormatParseError(control, m.start(3) + j + 1,
+                                               "too many at-signs")
+                    atsign = True
+        if char is None:
+            raise FormatParseError(control, i, "incomplete format directive")
 
-        char = control[i]
-        i += 1
         try:
-            d = format_directives[char](params, colon, atsign,
-                                        control, tilde, i, parent)
+            d = format_directives[char](params, colon, atsign, control,
+                                        m.start(), i, stack[-1][0] if stack \
+                                                                  else None)
         except FormatError, e:
             raise FormatParseError(control, i, e.control, *e.args)
         except KeyError:
             raise FormatParseError(control, i, "unknown format directive")
         if isinstance(d, DelimitedDirective):
-            for x in parse_control_string(control, i, d):
-                try:
-                    d.append(x)
-                except FormatError, e:
-                    if isinstance(x, Directive) and x is not d.delimiter:
-                        i += x.start
-                    raise FormatParseError(control, i, e.control, *e.args)
-            i = d.end
-        yield d
-        if parent and d is parent.delimiter:
-            return
+            stack.append((d, i))
+        elif stack:
+            add(d)
+        else:
+            directives.append(d)
+
+    # Unclosed delimited directives end with the control string.
+    while stack:
+        add(stack.pop()[0])
+    return directives
 
 class Formatter(object):
     def __init__(self, control):
@@ -1025,42 +1332,273 @@ class Formatter(object):
         self.need_prettyprinter = any([x.need_prettyprinter \
                                            for x in self.directives \
                                            if isinstance(x, Directive)])
-        self.need_charpos = self.need_prettyprinter or \
+        self.need_pprint = self.need_prettyprinter or \
+            any([x.need_pprint \
+                     for x in self.directives \
+                     if isinstance(x, Directive)])
+        self.need_charpos = self.need_pprint or \
             any([x.need_charpos \
                      for x in self.directives \
                      if isinstance(x, Directive)])
+        (self.plan, self.arity) = self.make_plan()
+        (self.template, self.conversions) = self.lower()
+        if self.template is not None:
+            self.argument_types = [(lowerable_types[c], c == "S") \
+                                       for c in self.conversions]
+
+    def lower(self):
+        """If the directives consist solely of literal strings and ~A, ~S,
+        and ~D directives without parameters or modifiers, return a pair
+        (template, conversions), where template is an equivalent %-style
+        format string and conversions is a string containing the directive
+        character for each argument.  Otherwise, return (None, None).
+
+        The template can only be used for arguments of certain types;
+        see lowerable."""
+        if not all([isinstance(x, str) or \
+                        (type(x) in (Aesthetic, Standard, Decimal) and \
+                             not (x.params or x.colon or x.atsign)) \
+                        for x in self.directives]):
+            return (None, None)
+        template = []
+        conversions = []
+        for x in self.directives:
+            if isinstance(x, basestring):
+                template.append(x.replace("%", "%%"))
+            else:
+                (spec, conversion) = lowered_directives[type(x)]
+                template.append(spec)
+                conversions.append(conversion)
+        return ("".join(template), "".join(conversions))
+
+    def lowerable(self, args):
+        """Return true if the template produced by lower may be used to
+        format the given arguments with identical results."""
+        if len(args) < len(self.conversions) or \
+                printervars.print_string_length is not None or \
+                printervars.print_budget is not None or \
+                printervars.print_lines is not None:
+            return False
+        for ((types, standard), arg) in zip(self.argument_types, args):
+            t = type(arg)
+            if t not in types or t in printers or \
+                    (standard and t is str and arg in ("\n", "\t")):
+                return False
+        return True
+
+    def make_plan(self):
+        """If the position of every argument used by the top-level
+        directives can be determined statically (i.e., if the control
+        string doesn't use ~*, V or # parameters, ~^, ~@?, or any of the
+        other directives whose argument consumption depends on the
+        arguments), return a pair (plan, arity), where arity is the number
+        of arguments required and plan is a list of triples (x, i, j):
+
+            (string, None, None): write the string;
+            (emit, i, None): call emit(stream, args[i]);
+            (format, i, j): call format(stream, Arguments(args[i:j])).
+
+        Otherwise, return (None, None)."""
+        plan = []
+        n = 0
+        for x in self.directives:
+            if isinstance(x, basestring):
+                plan.append((x, None, None))
+            elif isinstance(x, Plural) and x.colon:
+                if n == 0:
+                    return (None, None)
+                plan.append((x.emit, n - 1, None))
+            else:
+                m = x.arg_count()
+                if m is None:
+                    return (None, None)
+                elif m == 1 and hasattr(x, "emit"):
+                    plan.append((x.emit, n, None))
+                else:
+                    plan.append((x.format, n, n + m))
+                n += m
+        return (plan, n)
 
     def __call__(self, stream, *args):
+        if self.template is not None and \
+                not isinstance(stream, PrettyPrinter) and \
+                self.lowerable(args):
+            # Fastest path: let the % operator do all the work.
+            s = self.template % args[:len(self.conversions)]
+            if self.need_pprint and not isinstance(stream, PrintStream):
+                # Trailing blanks written to a pretty printer are held
+                # back, and would never be output.
+                s = s.rstrip(" ")
+            stream.write(s)
+            return
         if not isinstance(stream, PrettyPrinter) and self.need_prettyprinter:
             stream = PrettyPrinter(stream)
+        elif not isinstance(stream, (PrettyPrinter, PrintStream)) and \
+                self.need_pprint:
+            # A PrintStream doesn't count lines.
+            stream = PrintStream(stream) if printervars.print_lines is None \
+                                         else PrettyPrinter(stream)
         elif not isinstance(stream, CharposStream) and self.need_charpos:
             stream = CharposStream(stream)
+        if isinstance(stream, PrettyPrinter) and not stream.printing:
+            # Output cut short by a directive (e.g., ~A) ends the whole call,
+            # not just that directive, which then returns quietly, just as
+            # PrettyPrinter.pprint does.
+            stream.printing = True
+            stream.lines = 0
+            try:
+                return self(stream, *args)
+            except OutputTruncated:
+                return
+            finally:
+                stream.printing = False
         if len(args) == 1 and isinstance(args[0], Arguments):
             args = args[0]
+        elif self.plan is not None and printervars.print_budget is None:
+            # Fast path: the arguments are just a tuple.
+            if len(args) < self.arity:
+                raise FormatError("~D argument~:P required, ~D supplied",
+                                  self.arity, len(args))
+            write = stream.write
+            for (x, i, j) in self.plan:
+                if i is None:
+                    write(x)
+                elif j is None:
+                    x(stream, args[i])
+                else:
+                    x(stream, Arguments(args[i:j]))
+            return
         else:
             args = Arguments(args)
-        apply_directives(stream, self.directives, args)
-        return args
+        return apply_directives(stream, self.directives, args)
+
+    def strings(self, rows):
+        """Generate the output of formatting each row (a sequence of
+        arguments) in turn, as if by format(None, self, *row)."""
+        buffer = OutputBuffer()
+        chunks = buffer.chunks
+        template = self.template
+        n = len(self.conversions) if template is not None else 0
+        for row in rows:
+            if template is not None and self.lowerable(row):
+                s = template % tuple(row[:n])
+                yield s.rstrip(" ") if self.need_pprint else s
+                continue
+            try:
+                self(buffer, *row)
+            except OutputTruncated:
+                pass
+            yield "".join(chunks)
+            del chunks[:]
+
+    def map(self, stream, rows, batch_size=1024):
+        """Format each row (a sequence of arguments) in turn, writing the
+        output to stream as if by successive calls to format.  Unless the
+        stream keeps track of its character position, the output of up to
+        batch_size rows is collected and written at once."""
+        if isinstance(stream, CharposStream):
+            # The rows must see each other's output.
+            for row in rows:
+                format(stream, self, *row)
+            return
+        write = stream.write
+        batch = []
+        for s in self.strings(rows):
+            batch.append(s)
+            if len(batch) >= batch_size:
+                write("".join(batch))
+                del batch[:]
+        if batch:
+            write("".join(batch))
+
+    def iter(self, args, chunk_size=4096):
+        """Generate the output of formatting the given sequence of arguments
+        in chunks, as it's produced; see sinks.iter_output."""
+        return iter_output(lambda stream: format(stream, self, *args),
+                           chunk_size, printervars)
+
+class OutputBuffer(object):
+    """A write-only stream that collects the strings written to it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.write = self.chunks.append
+
+# Directive classes that lower to %-style conversions, and the types of
+# arguments for which those conversions are equivalent to the directives.
+lowered_directives = {Aesthetic: ("%s", "A"),
+                      Standard: ("%r", "S"),
+                      Decimal: ("%d", "D")}
+lowerable_types = {"A": frozenset([str, int, long, float, bool, type(None)]),
+                   "S": frozenset([str, int, long, float, bool, type(None)]),
+                   "D": frozenset([int, long])}
+
+formatters = {}
+max_cached_formatters = 1000
+
+# Pickled Formatter instances, indexed by control string; these are
+# loaded from disk by formatcache.prewarm, and unpickled on demand.
+pickled_formatters = {}
+
+def formatter(control):
+    """Return a Formatter for the given control string, re-using a cached
+    instance when possible."""
+    try:
+        return formatters[control]
+    except KeyError:
+        if control in pickled_formatters:
+            from formatcache import loads
+            f = loads(pickled_formatters[control])
+        else:
+            f = Formatter(control)
+        if len(formatters) >= max_cached_formatters:
+            # Make room by evicting a single (arbitrary) entry: clearing
+            # the whole cache would have every control string in use miss
+            # at once, and keeping track of recency would slow down hits.
+            formatters.popitem()
+        formatters[control] = f
+        return f
 
 def prepare_directives(directives):
     return [(x, True) if isinstance(x, basestring) else (x.format, False) \
                 for x in directives]
 
+def charge_budget(stream, budget):
+    """Charge the print budget for applying a list of directives, and cut
+    the output short if it has been exhausted."""
+    if budget.charge():
+        if isinstance(stream, PrettyPrinter):
+            stream.close_blocks("...")
+        else:
+            stream.write("...")
+        raise OutputTruncated(budget.exhausted)
+
 def fast_apply_directives(stream, write, directives, args):
-    """Apply a list of prepared directives."""
+    """Apply a list of prepared directives, and return the status of the
+    escape taken, if any."""
+    if printervars.print_budget is not None:
+        charge_budget(stream, printervars.print_budget)
     for (x, string) in directives:
         if string:
             write(x)
         else:
-            x(stream, args)
+            status = x(stream, args)
+            if status:
+                return status
 
 def apply_directives(stream, directives, args):
+    """Apply a list of directives, and return the status of the escape
+    taken, if any."""
+    if printervars.print_budget is not None:
+        charge_budget(stream, printervars.print_budget)
     write = stream.write
     for x in directives:
         if isinstance(x, basestring):
             write(x)
         else:
-            x.format(stream, args)
+            status = x.format(stream, args)
+            if status:
+                return status
 
 def format(destination, control, *args):
     if destination is None:
@@ -1069,12 +1607,26 @@ def format(destination, control, *args):
         stream = sys.stdout
     else:
         stream = destination
-    f = control if isinstance(control, Formatter) else Formatter(control)
+    f = control if isinstance(control, Formatter) else formatter(control)
     try:
         f(stream, *args)
-    except UpAndOut:
-        pass
+    except OutputTruncated:
+        # Only the outermost call should stop quietly; a nested call on a
+        # pretty printer (e.g., from a printer function) must end the
+        # enclosing one, too.
+        if isinstance(destination, PrettyPrinter) and destination.printing:
+            raise
     if destination is None:
         str = stream.getvalue()
         stream.close()
         return str
+
+def format_many(destination, control, rows):
+    """Format each of the given rows (sequences of arguments) according to
+    the control string, which is parsed only once.  The destination is as
+    for format, except that if it is None, a list of the output strings for
+    each row is returned."""
+    f = control if isinstance(control, Formatter) else formatter(control)
+    if destination is None:
+        return list(f.strings(rows))
+    f.map(sys.stdout if destination is True else destination, rows)
@@ -0,0 +1,120 @@
+"""A persistent cache of parsed control strings.
+
+Processes that use many control strings pay to parse each of them when
+they're first used.  Those costs can be paid once, instead, by calling
+
+    prewarm(controls, "/var/cache/myservice/format.cache")
+
+at startup.  The cache file holds a pickled Formatter for each control
+string it has seen, and is loaded all at once (using marshal, which is
+very fast); each Formatter is then unpickled the first time its control
+string is used.  Control strings not yet in the cache are parsed
+immediately, and the cache file is rewritten to include them.
+
+The cache is keyed by the library version, and is ignored (and rewritten)
+whenever that changes or the file can't be read.
+
+Since unpickling runs whatever code the pickles ask for, anyone who can
+write the cache file can run code in every process that loads it.  The
+file must therefore be kept somewhere only the user of the service can
+write to, and load refuses to read one that isn't owned by the current
+user or is writable by anyone else."""
+
+import errno
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+import types
+import cPickle as pickle
+from cStringIO import StringIO
+from format import Directive, Formatter, formatters, pickled_formatters
+import format
+
+__all__ = ["prewarm", "load", "save", "dumps", "loads"]
+
+# Objects that can't be pickled by reference, and their persistent ids.
+constants = {"V": Directive.variable_parameter,
+             "#": Directive.remaining_parameter,
+             "N": type(None)}
+constant_ids = dict([(id(obj), pid) for (pid, obj) in constants.items()])
+
+def persistent_id(obj):
+    if isinstance(obj, types.MethodType):
+        # Bound methods are looked up again by their function's name,
+        # since e.g. format may have been rebound to format_words.
+        return (obj.im_self, obj.im_func.__name__)
+    return constant_ids.get(id(obj))
+
+def persistent_load(pid):
+    if isinstance(pid, tuple):
+        return getattr(*pid)
+    return constants[pid]
+
+def dumps(formatter):
+    """Return a pickled representation of a Formatter."""
+    stream = StringIO()
+    pickler = pickle.Pickler(stream, pickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = persistent_id
+    pickler.dump(formatter)
+    return stream.getvalue()
+
+def loads(data):
+    """Return the Formatter pickled by dumps."""
+    unpickler = pickle.Unpickler(StringIO(data))
+    unpickler.persistent_load = persistent_load
+    return unpickler.load()
+
+def version():
+    """Return a string that identifies the library and Python versions."""
+    source = os.path.splitext(format.__file__)[0] + ".py"
+    with open(source if os.path.exists(source) else format.__file__) as f:
+        digest = hashlib.md5(f.read()).hexdigest()
+    return "%s %d.%d" % ((digest,) + sys.version_info[:2])
+
+def check_private(f, path):
+    """Raise OSError unless the open file f is owned by the current user and
+    writable by no one else."""
+    st = os.fstat(f.fileno())
+    if st.st_uid != os.getuid() or st.st_mode & 0022:
+        raise OSError(errno.EPERM, "cache file not owned by the current "
+                      "user, or writable by others", path)
+
+def load(path):
+    """Return a dictionary mapping control strings to pickled Formatters
+    from the cache file at path, or an empty dictionary if the file is
+    missing, unreadable, or stale.  Raise OSError if the file can't be
+    trusted."""
+    try:
+        with open(path, "rb") as f:
+            check_private(f, path)
+            (file_version, entries) = marshal.load(f)
+    except (IOError, EOFError, ValueError, TypeError):
+        return {}
+    return entries if file_version == version() else {}
+
+def save(path, entries):
+    """Atomically replace the cache file at path with the given entries."""
+    (fd, temp) = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            marshal.dump((version(), entries), f)
+        os.rename(temp, path)
+    except:
+        os.unlink(temp)
+        raise
+
+def prewarm(controls, path):
+    """Make Formatters for the given control strings available to format
+    as quickly as possible, using the cache file at path."""
+    entries = load(path)
+    missing = [control for control in controls if control not in entries]
+    for control in missing:
+        f = formatters.get(control) or Formatter(control)
+        if len(formatters) < format.max_cached_formatters:
+            formatters[control] = f
+        entries[control] = dumps(f)
+    pickled_formatters.update(entries)
+    if missing:
+        save(path, entries)
@@ -0,0 +1,56 @@
+"""Hex dumps of binary buffers.
+
+The dump is produced lazily, a line at a time, from a memoryview of the
+buffer, so that only a small window of a large buffer is ever copied."""
+
+__all__ = ["hexdump"]
+
+printable = "".join([chr(i) if 32 <= i < 127 else "." for i in range(256)])
+hexbytes = dict([(chr(i), "%02x " % i) for i in range(256)])
+
+def reader(buf, view):
+    """Return a function of start and stop offsets that returns those bytes
+    of buf, copying as few others as possible."""
+    k = view.itemsize
+    if view.ndim == 1:
+        # Slice whole items, then trim to the bytes wanted.
+        def read(start, stop):
+            offset = start % k
+            return view[start // k:(stop + k - 1) // k] \
+                       .tobytes()[offset:offset + stop - start]
+        return read
+    # Multi-dimensional views can't be sliced, but many objects can be
+    # read in place through the old buffer interface; copy the others.
+    try:
+        flat = buffer(buf)
+    except TypeError:
+        flat = view.tobytes()
+    return lambda start, stop: str(flat[start:stop])
+
+def hexdump(buf, length=None, width=16, chunk_size=1 << 16):
+    """Generate the lines of a hex dump of (at most length bytes of) buf,
+    which may be any object that supports the buffer protocol. Each line
+    shows the offset, the hex values, and the printable characters of width
+    bytes, like hexdump -C; e.g.,
+
+        00000000  68 65 6c 6c 6f 0a                                |hello.|
+
+    The buffer is read chunk_size bytes (rounded to a multiple of width)
+    at a time."""
+    view = memoryview(buf)
+    n = view.itemsize
+    for dim in view.shape:
+        n *= dim
+    if length is not None:
+        n = min(n, length)
+    read = reader(buf, view)
+    chunk_size = max(chunk_size // width, 1) * width
+    hex_width = 3 * width - 1
+    for start in xrange(0, n, chunk_size):
+        chunk = read(start, min(start + chunk_size, n))
+        hexed = "".join(map(hexbytes.__getitem__, chunk))
+        chars = chunk.translate(printable)
+        for i in xrange(0, len(chunk), width):
+            yield "%08x  %-*s  |%s|" % (start + i, hex_width,
+                                        hexed[3*i:3*(i + width) - 1],
+                                        chars[i:i + width])
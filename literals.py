@@ -0,0 +1,144 @@
+"""Pretty-print JSON and Python literals directly from their text.
+
+Rather than parsing the whole text into Python objects and then printing
+those, pprint_literals scans the text a token at a time and feeds the
+tokens straight to a PrettyPrinter as logical blocks, strings, and fill
+newlines.  Since the pretty printer only needs a bounded amount of
+lookahead, memory use is bounded by the nesting depth of the data (and
+the length of its longest atom), not its size; the text may be a string
+or a memory-mapped file.
+
+Strings and numbers are copied through verbatim.  print_length and
+print_level are honoured, and elided values are skipped without being
+printed.  A sequence of values (e.g., JSON lines) is printed one value
+per line.  Calls like set([1, 2]) or Point(x=1, y=2), as found in the
+reprs of many objects, are printed as blocks, too."""
+
+import re
+import printervars
+
+__all__ = ["pprint_literals"]
+
+space = re.compile(r"\s*")
+token = re.compile(r"""\s*(?:
+    ([A-Za-z_][\w.]*\(|[\[{(])          # 1: opening delimiter or call
+  | ([\]})])                            # 2: closing delimiter
+  | (,)                                 # 3: comma
+  | ([:=])                              # 4: colon or keyword argument
+  | ([uUbB]?[rR]?                       # 5: string
+     (?:'''[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*'''
+       |\"\"\"[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*\"\"\"
+       |'[^'\\\n]*(?:\\.[^'\\\n]*)*'
+       |"[^"\\\n]*(?:\\.[^"\\\n]*)*"))
+  | ([-+]?(?:0[xX][0-9a-fA-F]+          # 6: number or name
+             |(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)[jJlL]?
+     |[A-Za-z_]\w*))
+""", re.VERBOSE | re.DOTALL)
+
+OPEN, CLOSE, COMMA, COLON = range(1, 5)
+closers = {"[": "]", "{": "}", "(": ")"}
+
+class Container(object):
+    """The state of an open list, dict, tuple, set, or call."""
+
+    __slots__ = ("opener", "count", "comma", "colon")
+
+    def __init__(self, opener):
+        self.opener = opener
+        self.count = 0          # number of elements seen
+        self.comma = False      # comma seen since the last element
+        self.colon = False      # colon seen since the last element
+
+def syntax_error(data, pos):
+    return ValueError("invalid literal syntax at offset %d: %r" % \
+                          (pos, data[pos:pos+20]))
+
+def next_token(data, pos):
+    """Return the match for the token at pos, or None at the end of the
+    data."""
+    m = token.match(data, pos)
+    if not m and space.match(data, pos).end() < len(data):
+        raise syntax_error(data, space.match(data, pos).end())
+    return m
+
+def skip(data, pos):
+    """Skip tokens up to the first unmatched closing delimiter, and return
+    its position."""
+    depth = 0
+    while True:
+        m = next_token(data, pos)
+        if not m:
+            raise syntax_error(data, pos)
+        if m.lastindex == OPEN:
+            depth += 1
+        elif m.lastindex == CLOSE:
+            if depth == 0:
+                return m.start(CLOSE)
+            depth -= 1
+        pos = m.end()
+
+def pprint_literals(pp, data, pos=0):
+    """Pretty-print the literals in data, starting at pos."""
+    stack = []
+    values = 0                  # number of top-level values
+    while True:
+        m = next_token(data, pos)
+        if not m:
+            break
+        kind = m.lastindex
+        text = m.group(kind)
+        pos = m.end()
+
+        if kind == CLOSE:
+            if not stack or closers[stack[-1].opener[-1]] != text:
+                raise syntax_error(data, m.start(kind))
+            top = stack.pop()
+            if top.opener == "(" and top.count == 1 and top.comma:
+                pp.write(",")   # singleton tuple
+            pp.end(suffix=text)
+            continue
+        elif kind == COMMA:
+            if not stack or stack[-1].comma:
+                raise syntax_error(data, m.start(kind))
+            stack[-1].comma = True
+            continue
+        elif kind == COLON:
+            if not stack:
+                raise syntax_error(data, m.start(kind))
+            stack[-1].colon = True
+            pp.write(": " if text == ":" else text)
+            continue
+
+        # Otherwise, we're at the start of a value.
+        if not stack:
+            if values > 0:
+                pp.write("\n")
+            values += 1
+        elif stack[-1].colon:
+            stack[-1].colon = False
+        else:
+            top = stack[-1]
+            if top.comma:
+                top.comma = False
+                pp.write(", ")
+                if printervars.print_pretty:
+                    pp.newline(fill=True)
+            elif top.count > 0:
+                raise syntax_error(data, m.start(kind))
+            top.count += 1
+            if printervars.print_length is not None and \
+                    top.count > printervars.print_length:
+                pp.write("...")
+                pos = skip(data, m.start(kind))
+                continue
+        if kind == OPEN:
+            if pp.print_level_exceeded():
+                pp.write("#")
+                pos = next_token(data, skip(data, pos)).end()
+            else:
+                pp.begin(prefix=text, suffix=closers[text[-1]])
+                stack.append(Container(text))
+        else:
+            pp.write(text)
+    if stack:
+        raise syntax_error(data, pos)
@@ -0,0 +1,73 @@
+"""Lazy FORMAT-style log messages for the standard logging module.
+
+There are two ways to use FORMAT control strings as log messages.  The
+first is to attach a FormatFormatter to a handler, and then log control
+strings and their arguments just as one normally would with %-style
+messages:
+
+    handler.setFormatter(FormatFormatter("%(levelname)s: %(message)s"))
+    log.debug("~D item~:P: ~{~A~^, ~}", len(items), items)
+
+The second, which works with any formatter, is to wrap the message in a
+FormattedMessage:
+
+    log.debug(FormattedMessage("~D item~:P", len(items)))
+
+Either way, the arguments are formatted only if (and when) a handler
+actually emits the record, using a cached Formatter for the control
+string; a call that is filtered out by level costs no more than any other
+logging call.
+
+A FormatFormatter may also see records logged by other code that uses
+%-style messages.  So it takes a message to be a control string only if
+it contains a tilde and can be formatted with the record's arguments;
+any other message is formatted just as logging.Formatter would."""
+
+import logging
+from format import format, FormatError
+
+__all__ = ["FormattedMessage", "FormatFormatter"]
+
+class FormattedMessage(object):
+    """A message that is formatted with a control string and arguments the
+    first time it is converted to a string."""
+
+    __slots__ = ("control", "args", "string")
+
+    def __init__(self, control, *args):
+        self.control = control
+        self.args = args
+        self.string = None
+
+    def __str__(self):
+        if self.string is None:
+            self.string = format(None, self.control, *self.args)
+        return self.string
+
+    def __repr__(self):
+        return "%s(%r%s)" % (type(self).__name__, self.control,
+                             "".join([", %r" % (arg,) for arg in self.args]))
+
+class FormatFormatter(logging.Formatter):
+    """A logging formatter that treats the messages of the records that it
+    formats as FORMAT control strings, rather than %-style format strings,
+    if they contain a tilde and can be formatted as such.
+
+    The record's message is replaced by an equivalent FormattedMessage, so
+    that other handlers that see the same record do not format it again."""
+
+    def format(self, record):
+        if isinstance(record.msg, basestring) and "~" in record.msg:
+            args = record.args
+            if not isinstance(args, tuple):
+                # LogRecord unwraps a lone mapping argument.
+                args = (args,)
+            message = FormattedMessage(record.msg, *args)
+            try:
+                message.__str__()
+            except FormatError:
+                pass            # presumably a %-style message after all
+            else:
+                record.msg = message
+                record.args = ()
+        return super(FormatFormatter, self).format(record)
@@ -1,16 +1,34 @@
 from __future__ import with_statement
 
 import sys
+from array import array
 from collections import deque
+from itertools import islice
 from charpos import CharposStream
 from bindings import bindings
+from sinks import StringSink, iter_output
 import printervars
 
-__all__ = ["PrettyPrinter", "pprint"]
+__all__ = ["PrettyPrinter", "PrintStream", "OutputTruncated",
+           "PrintLinesExceeded", "pprint", "pformat", "iter_pformat"]
 
 class PrintLevelExceeded(StopIteration):
     pass
 
+# Printers for specific types, indexed by type.  Each is a function of two
+# arguments, a PrettyPrinter and the object to print.
+printers = {}
+
+class OutputTruncated(Exception):
+    """Raised when output has been cut short and all open logical blocks
+    have been closed."""
+    pass
+
+class PrintLinesExceeded(OutputTruncated):
+    """Raised when output is abandoned because it has reached print_lines
+    lines."""
+    pass
+
 class Token(object):
     """Base class for prettyprinter tokens.
 
@@ -18,6 +36,7 @@ class Token(object):
     corresponding PrettyPrinter methods should be used instead."""
 
     size = 0
+    length = 0                  # the amount this token adds to rightotal
 
     def output(self, pp):
         """Send output to the given PrettyPrinter stream.
@@ -28,9 +47,14 @@ class Token(object):
 class Begin(Token):
     """Begin a logical block."""
 
-    def __init__(self, prefix="", per_line=False):
+    def __init__(self, prefix="", per_line=False, suffix=""):
         self.prefix = prefix
         self.per_line = per_line
+        self.suffix = suffix    # only used if the output is truncated
+
+    @property
+    def length(self):
+        return len(self.prefix)
 
     def output(self, pp):
         offset = pp.charpos
@@ -44,6 +68,7 @@ class Begin(Token):
                               pp.space,
                               pp.charpos - len(pp.prefix),
                               self.size <= pp.space))
+        pp.suffixes.append(self.suffix)
 
 class End(Token):
     """End a logical block."""
@@ -51,11 +76,16 @@ class End(Token):
     def __init__(self, suffix=""):
         self.suffix = suffix
 
+    @property
+    def length(self):
+        return len(self.suffix)
+
     def output(self, pp):
         if self.suffix:
             pp._write(self.suffix)
         try:
             pp.printstack.pop()
+            pp.suffixes.pop()
             pp.prefix = pp.printstack[-1][0] if pp.printstack else ""
         except IndexError:
             pass
@@ -66,7 +96,7 @@ class Newline(Token):
     def indent(self, pp, n):
         """Break the current line and indent to column n."""
         pp.blankspace = ""      # suppress trailing whitespace
-        pp.terpri()
+        pp._terpri()
         pp._write(" " * n)
 
 class Linear(Newline):
@@ -85,6 +115,11 @@ class Mandatory(Newline):
     def output(self, pp):
         self.indent(pp, pp.printstack[-1][-2])
 
+class FreshLine(Token):
+    def output(self, pp):
+        if pp.charpos > 0:
+            pp._write("\n")
+
 class Indentation(Token):
     def __init__(self, offset=0, relative=False):
         self.offset = offset
@@ -101,16 +136,21 @@ class String(Token):
         self.string = string
         self.size = size
 
+    @property
+    def length(self):
+        return self.size
+
     def output(self, pp):
         pp._write(self.string)
 
+exhausted = object()            # the lookahead past the end of a list
+
 class LogicalBlock(object):
     """A context manager for logical blocks."""
 
     def __init__(self, pp, lst, *args, **kwargs):
         self.pp = pp
-        self.list = lst and list(lst)
-        self.len = len(self.list) if lst else 0
+        self.list = lst
         self.suffix = kwargs.pop("suffix", "")
         self.args = args
         self.kwargs = kwargs
@@ -118,15 +158,22 @@ class LogicalBlock(object):
 
     def __enter__(self):
         try:
-            self.pp.begin(*self.args, **self.kwargs)
+            self.pp.begin(*self.args, suffix=self.suffix, **self.kwargs)
         except PrintLevelExceeded, e:
             self.pp.write("#")
             self.print_level_exceeded = e
             return iter([])
+        # The elements are consumed lazily, one ahead of the caller, so that
+        # lst may be an iterator of any length.
+        self.iter = iter(self.list or ())
         self.index = 0
+        self.lookahead = next(self.iter, exhausted)
         return self
 
     def __exit__(self, type, value, traceback):
+        if type and issubclass(type, OutputTruncated):
+            # The printer has already closed all open blocks.
+            return False
         if not self.print_level_exceeded:
             self.pp.end(suffix=self.suffix)
         return type and issubclass(type, StopIteration)
@@ -135,20 +182,39 @@ class LogicalBlock(object):
         return self
 
     def next(self):
-        if self.index == self.len:
+        value = self.lookahead
+        if value is exhausted:
             raise StopIteration
         elif self.index == printervars.print_length:
             self.pp.write("...")
             raise StopIteration
-        value = self.list[self.index]
         self.index += 1
+        self.lookahead = next(self.iter, exhausted)
         return value
 
     def exit_if_list_exhausted(self):
-        if self.index == self.len:
+        if self.lookahead is exhausted:
             raise StopIteration
 
 class PrettyPrinter(CharposStream):
+    """An Oppen-style pretty printer.  Output is produced via the methods
+    begin, write, newline, indent, and end (or logical_block and pprint),
+    and is sent to the underlying stream as soon as the printer has decided
+    where the line breaks in it go.
+
+    A pretty printer may therefore be used to print a stream of unbounded
+    length, e.g., a generator of records, since it only needs to look ahead
+    as far as the end of the current line to decide whether a block fits.
+    It holds the nesting depth's worth of logical blocks and conditional
+    newlines whose sizes aren't known yet, plus the pending tokens of at
+    most one line, so its memory use is bounded by the width times the
+    nesting depth, independent of the length of the output.  Only
+    zero-width tokens (e.g., empty blocks or consecutive newlines) can
+    accumulate without filling up the line; if print_lookahead is not None
+    when the printer is created, it is the maximum number of tokens that
+    may be pending at once, beyond which the outermost pending blocks are
+    treated as too long to fit, and broken."""
+
     def __init__(self, stream=sys.stdout, width=None, charpos=None):
         """Pretty-print to stream, with right margin at width characters,
         starting at position charpos."""
@@ -165,13 +231,21 @@ class PrettyPrinter(CharposStream):
             except AttributeError:
                 charpos = 0
 
+        lookahead = printervars.print_lookahead
+        if lookahead is not None and lookahead <= 0:
+            raise ValueError("lookahead must be positive")
+        self.lookahead = sys.maxint if lookahead is None else lookahead
+
         self.space = self.margin - charpos
         self.scanstack = deque()
         self.printstack = list()
+        self.suffixes = list()  # suffixes of the blocks on the print stack
         self.queue = list()
         self.blankspace = ""    # trailing whitespace
         self.prefix = ""        # per-line prefix
         self.level = 0          # depth counter
+        self.lines = 0          # newlines output by the current call
+        self.printing = False   # within a call of pprint or format
 
     def write(self, string):
         """Enqueue a string for output."""
@@ -186,11 +260,25 @@ class PrettyPrinter(CharposStream):
                 q.string += string
                 q.size += l
             else:
+                # Since strings are merged, this can't exceed the lookahead
+                # by more than one token.
                 self.queue.append(String(string, l))
             self.rightotal += l
-            while self.rightotal - self.leftotal > self.space:
-                self.scanstack.popleft().size = 999999   # infinity
-                self.flush()
+            if self.rightotal - self.leftotal > self.space:
+                self.break_pending()
+
+    def break_pending(self):
+        """Decide that the oldest pending blocks and newlines don't fit,
+        until what's pending fits on the rest of the line and is within
+        the lookahead limit."""
+        # Output whatever's already been decided, since it may change the
+        # space remaining on the line.
+        self.flush()
+        while self.scanstack and \
+                (self.rightotal - self.leftotal > self.space or \
+                     len(self.queue) > self.lookahead):
+            self.scanstack.popleft().size = 999999   # infinity
+            self.flush()
 
     def begin(self, *args, **kwargs):
         """Begin a new logical block."""
@@ -208,15 +296,17 @@ class PrettyPrinter(CharposStream):
         self.rightotal += len(tok.prefix)
         self.scanstack.append(tok)
         self.level += 1
+        if len(self.queue) > self.lookahead:
+            self.break_pending()
 
     def end(self, *args, **kwargs):
         """End the current logical block."""
         assert not self.closed, "I/O operation on closed stream"
         tok = End(*args, **kwargs)
+        self.level -= 1
         if not self.scanstack:
             tok.output(self)
         else:
-            self.level -= 1
             self.queue.append(tok)
             self.rightotal += len(tok.suffix)
 
@@ -227,6 +317,8 @@ class PrettyPrinter(CharposStream):
                 top.size += self.rightotal
             if not self.scanstack:
                 self.flush()
+            elif len(self.queue) > self.lookahead:
+                self.break_pending()
 
     def newline(self, fill=False, mandatory=False):
         """Enqueue a conditional newline."""
@@ -249,11 +341,32 @@ class PrettyPrinter(CharposStream):
         else:
             self.scanstack.append(tok)
         self.queue.append(tok)
+        if len(self.queue) > self.lookahead:
+            self.break_pending()
 
     def indent(self, *args, **kwargs):
         """Set the indentation level for the current logical block."""
         assert not self.closed, "I/O operation on closed stream"
-        self.queue.append(Indentation(*args, **kwargs))
+        tok = Indentation(*args, **kwargs)
+        if self.scanstack:
+            self.queue.append(tok)
+            if len(self.queue) > self.lookahead:
+                self.break_pending()
+        elif self.printstack:
+            tok.output(self)    # the block has already been committed to
+
+    def fresh_line(self):
+        """Output a newline, unless at the beginning of a line.  Where
+        that is depends on the pending output, so it's decided only once
+        that has been printed."""
+        assert not self.closed, "I/O operation on closed stream"
+        tok = FreshLine()
+        if self.scanstack:
+            self.queue.append(tok)
+            if len(self.queue) > self.lookahead:
+                self.break_pending()
+        else:
+            tok.output(self)
 
     def logical_block(self, lst=None, *args, **kwargs):
         """Return a context manager for a new logical block."""
@@ -261,7 +374,8 @@ class PrettyPrinter(CharposStream):
         return LogicalBlock(self, lst, *args, **kwargs)
 
     def pprint(self, obj):
-        """Pretty-print the given object."""
+        """Pretty-print the given object.  If the output is cut short (by
+        print_lines or print_budget), the outermost call returns quietly."""
         def inflection(obj):
             if isinstance(obj, list):
                 return ("[", "]")
@@ -269,12 +383,40 @@ class PrettyPrinter(CharposStream):
                 return ("%s([" % type(obj).__name__, "])")
 
         assert not self.closed, "I/O operation on closed stream"
-        if isinstance(obj, basestring):
-            self.write(repr(obj) if printervars.print_escape and \
-                                     obj not in ("\n", "\t") \
-                                 else obj)
+        if not self.printing:
+            self.printing = True
+            self.lines = 0
+            try:
+                self.pprint(obj)
+            except OutputTruncated:
+                pass
+            finally:
+                self.printing = False
+            return
+        trace = printervars.print_trace
+        if trace is not None and trace.pp is None:
+            trace.pprint(self, obj)
+            return
+        budget = printervars.print_budget
+        if budget is not None and budget.charge():
+            self.close_blocks("...")
+            raise OutputTruncated(budget.exhausted)
+        if not printervars.print_pretty and budget is None and \
+                (trace is None or trace.frame is None) and \
+                type(obj) in flat_delimiters:
+            # Calls that aren't sampled by a trace may still print flat.
+            try:
+                self.write(flat_repr(obj, self.level))
+                return
+            except NotFlat:
+                pass
+        printer = printers.get(type(obj))
+        if printer is not None:
+            printer(self, obj)
+        elif isinstance(obj, basestring):
+            self.write(printed_string(obj))
         elif isinstance(obj, (int, float, long, complex)):
-            self.write(repr(obj) if printervars.print_escape else str(obj))
+            self.write(printed_number(obj))
         elif isinstance(obj, (list, set, frozenset, deque)):
             (prefix, suffix) = inflection(obj)
             with self.logical_block(obj, prefix=prefix, suffix=suffix) as l:
@@ -310,11 +452,143 @@ class PrettyPrinter(CharposStream):
                     self.write(", ")
                     if printervars.print_pretty:
                         self.newline(fill=True)
+        elif isinstance(obj, array):
+            self.pprint_array(obj)
+        elif isinstance(obj, memoryview):
+            self.pprint_memoryview(obj)
+        elif printervars.print_pretty and isinstance(obj, bytearray):
+            self.pprint_bytes(obj)
         elif printervars.print_pretty and hasattr(obj, "__pprint__"):
             obj.__pprint__(self)
+        elif "numpy" in sys.modules and \
+                isinstance(obj, sys.modules["numpy"].ndarray):
+            self.pprint_ndarray(obj)
         else:
             self.write(repr(obj) if printervars.print_escape else str(obj))
 
+    # Arrays and other buffers may be very large, so we never print them
+    # via repr, and only look at as many elements as print_length allows.
+    # The visible elements are converted en masse via tolist.
+
+    def pprint_array(self, obj):
+        """Pretty-print an array.array."""
+        if self.print_level_exceeded():
+            self.write("#")
+            return
+        with self.logical_block(None, prefix="array(", suffix=")"):
+            self.write("%r, " % obj.typecode)
+            if obj.typecode in ("c", "u"):
+                # Convert only the characters that will be shown.
+                convert = array.tostring if obj.typecode == "c" \
+                                         else array.tounicode
+                n = printervars.print_string_length
+                tail = printervars.print_string_tail or 0
+                if n is None or len(obj) <= n + tail:
+                    self.pprint(convert(obj))
+                else:
+                    last = convert(obj[len(obj) - tail:]) if tail else ""
+                    self.write(truncated_string(convert(obj[:n]), last,
+                                                len(obj) - n - tail))
+            else:
+                self.pprint_elements(head(obj))
+
+    def pprint_memoryview(self, obj):
+        """Pretty-print a memoryview, along with its shape and format."""
+        if printervars.print_pretty and obj.ndim == 1 and \
+                obj.itemsize == 1 and obj.format in ("B", "b", "c"):
+            self.pprint_bytes(obj)
+            return
+        if self.print_level_exceeded():
+            self.write("#")
+            return
+        with self.logical_block(None, prefix="memoryview(", suffix=")"):
+            elements = memoryview_head(obj)
+            if elements is None:
+                self.write("...")
+            else:
+                self.pprint_elements(elements)
+            self.pprint_attributes(shape=tuple(map(int, obj.shape)),
+                                   format=obj.format)
+
+    def pprint_ndarray(self, obj):
+        """Pretty-print a NumPy array, along with its shape and dtype."""
+        def pprint_rows(a):
+            if a.ndim == 0:
+                self.pprint(a.tolist())
+            elif a.ndim == 1:
+                self.pprint_elements(head(a), a.dtype.kind != "O")
+            else:
+                rows = list(a if printervars.print_length is None \
+                              else a[:printervars.print_length + 1])
+                with self.logical_block(rows, prefix="[", suffix="]") as l:
+                    for row in l:
+                        pprint_rows(row)
+                        l.exit_if_list_exhausted()
+                        self.write(", ")
+                        if printervars.print_pretty:
+                            self.newline(fill=True)
+
+        if self.print_level_exceeded():
+            self.write("#")
+            return
+        with self.logical_block(None, prefix="array(", suffix=")"):
+            pprint_rows(obj)
+            self.pprint_attributes(shape=obj.shape, dtype=str(obj.dtype))
+
+    def pprint_bytes(self, obj):
+        """Pretty-print a bytearray or a memoryview of bytes as a hex dump
+        of at most print_bytes bytes."""
+        if self.print_level_exceeded():
+            self.write("#")
+            return
+        from hexdump import hexdump
+        limit = printervars.print_bytes
+        with self.logical_block(None, prefix="%s(" % type(obj).__name__,
+                                suffix=")"):
+            lines = hexdump(obj, limit)
+            for line in lines:
+                self.write(line)
+                break
+            for line in lines:
+                self.newline(mandatory=True)
+                self.write(line)
+            if limit is not None and len(obj) > limit:
+                if limit > 0:
+                    self.newline(mandatory=True)
+                self.write("...")
+
+    def pprint_elements(self, elements, atomic=True):
+        """Pretty-print a list of elements taken from an array.  If atomic
+        is true, the elements are all numbers or strings, and are converted
+        to strings all at once."""
+        if atomic:
+            elements = map(repr if printervars.print_escape else str,
+                           elements)
+        with self.logical_block(elements, prefix="[", suffix="]") as l:
+            for x in l:
+                if atomic:
+                    self.write(x)
+                else:
+                    self.pprint(x)
+                l.exit_if_list_exhausted()
+                self.write(", ")
+                if printervars.print_pretty:
+                    self.newline(fill=True)
+
+    def pprint_attributes(self, **attributes):
+        """Print keyword-style attributes following an array's elements."""
+        for name in sorted(attributes):
+            self.write(", ")
+            if printervars.print_pretty:
+                self.newline(fill=True)
+            self.write("%s=%r" % (name, attributes[name]))
+
+    def print_level_exceeded(self):
+        """Return true if beginning a logical block would exceed the
+        print level."""
+        return printervars.print_level is not None and \
+            self.level >= printervars.print_level
+
     def flush(self):
         """Output as many queue entries as possible."""
         assert not self.closed, "I/O operation on closed stream"
@@ -325,7 +599,7 @@ class PrettyPrinter(CharposStream):
             if q.size < 0:
                 break
             q.output(self)
-            total += q.size
+            total += q.length
             i += 1
         if i > 0:
             self.queue = queue[i:]
@@ -345,6 +619,41 @@ class PrettyPrinter(CharposStream):
         self.blankspace = ""
         self.space = self.margin - len(self.prefix)
 
+    def close_blocks(self, marker):
+        """Write the given marker, then end every open logical block."""
+        suffixes = list(self.suffixes)
+        for tok in self.queue:
+            if isinstance(tok, Begin):
+                suffixes.append(tok.suffix)
+            elif isinstance(tok, End):
+                suffixes.pop()
+        self.write(marker)
+        for suffix in reversed(suffixes):
+            self.end(suffix=suffix)
+
+    def _terpri(self):
+        """Output a newline that is part of the pretty-printed output,
+        subject to the print_lines limit."""
+        if printervars.print_lines is not None:
+            self.lines += 1
+            if self.lines >= printervars.print_lines:
+                self.truncate(" ..")
+                raise PrintLinesExceeded(self.lines)
+        self.terpri()
+
+    def truncate(self, marker):
+        """Abandon all pending output: write the given marker followed by
+        the suffixes of any open logical blocks, and reset the printer to
+        its initial state."""
+        self.blankspace = ""
+        self.prefix = ""
+        self._write(marker + "".join(reversed(self.suffixes)))
+        self.scanstack.clear()
+        self.queue = list()
+        self.printstack = list()
+        self.suffixes = list()
+        self.level = 0
+
     def _write(self, str):
         """Write the given string to the underlying stream."""
 
@@ -361,17 +670,24 @@ class PrettyPrinter(CharposStream):
         # needed for things that depend on charpos to work correctly
         # (e.g., indentation).
 
+        write = self.stream.write
         (before, newline, after) = str.partition("\n")
         if newline:
-            self.stream.write(self.blankspace + before)
-            self.blankspace = ""
-            self.terpri()
+            if self.blankspace:
+                write(self.blankspace)
+                self.blankspace = ""
+            if before:
+                write(before)
+            self._terpri()
             self._write(after)
         else:
             i = n = len(before)
             while i > 0 and before[i-1] == " ":
                 i -= 1
-            self.stream.write(self.blankspace + before[:i])
+            if self.blankspace:
+                write(self.blankspace)
+            if i:
+                write(before[:i])
             self.blankspace = before[i:]
             self.space -= n
 
@@ -379,9 +695,254 @@ class PrettyPrinter(CharposStream):
     def charpos(self):
         return self.margin - self.space
 
+def printed_string(s):
+    """Return the printed representation of the string s: its repr if
+    print_escape is true (unless it's just a newline or tab), otherwise
+    the string itself.  If s is longer than print_string_length, only that
+    many initial characters (and print_string_tail final ones) are shown,
+    and only those are escaped."""
+    escape = printervars.print_escape and s not in ("\n", "\t")
+    n = printervars.print_string_length
+    tail = printervars.print_string_tail or 0
+    if n is None or len(s) <= n + tail:
+        return repr(s) if escape else s
+    return truncated_string(s[:n], s[-tail:] if tail else "",
+                            len(s) - n - tail, escape)
+
+def truncated_string(head, tail, omitted, escape=None):
+    """Return the printed representation of a string cut short, showing
+    its head and tail and the number of characters omitted between them."""
+    if escape is None:
+        escape = printervars.print_escape
+    marker = "...[%d more %s]" % (omitted, "char" if omitted == 1 else "chars")
+    if escape:
+        return repr(head) + marker + ("..." + repr(tail) if tail else "")
+    else:
+        return head + marker + ("..." + tail if tail else "")
+
+def printed_number(n):
+    """Return the printed representation of the number n."""
+    return repr(n) if printervars.print_escape else str(n)
+
+atom_types = frozenset([str, unicode, int, long, float, complex, bool])
+
+# When print_pretty is false, no newlines are ever inserted, so a subtree
+# made only of builtin types prints as one flat string.  flat_repr builds
+# that string in a single pass, and hands containers of plain atoms to the
+# interpreter's repr wholesale.  Anything else (another type, or a builtin
+# type with a registered printer) raises NotFlat, and the caller falls back
+# to the general path.
+
+class NotFlat(Exception):
+    pass
+
+flat_atoms = atom_types | frozenset([type(None)])
+flat_delimiters = {list: ("[", "]"),
+                   tuple: ("(", ")"),
+                   dict: ("{", "}"),
+                   set: ("set([", "])"),
+                   frozenset: ("frozenset([", "])"),
+                   deque: ("deque([", "])")}
+
+def reprable(obj):
+    """Return true if the repr of the given container is exactly what
+    flat_repr would produce."""
+    t = type(obj)
+    if t is dict:
+        types = set(map(type, obj))
+        types.update(map(type, obj.itervalues()))
+        values = obj.values()
+    elif t is deque or not obj:
+        return False            # repr shows maxlen; set() is set([])
+    else:
+        types = set(map(type, obj))
+        values = obj
+    if not types <= flat_atoms or [x for x in types if x in printers]:
+        return False
+    if str in types or unicode in types:
+        # printed_string doesn't escape a lone newline or tab.
+        return printervars.print_string_length is None and \
+            "\n" not in obj and "\t" not in obj and \
+            "\n" not in values and "\t" not in values
+    return True
+
+def flat_repr(obj, level):
+    """Return the non-pretty printed representation of obj as a logical
+    block at the given depth, or raise NotFlat."""
+    t = type(obj)
+    if t in printers:
+        raise NotFlat()
+    elif t is str or t is unicode:
+        return printed_string(obj)
+    elif t in flat_atoms:
+        return printed_number(obj)
+    elif t not in flat_delimiters:
+        raise NotFlat()
+    elif printervars.print_level is not None and \
+            level >= printervars.print_level:
+        return "#"
+
+    n = printervars.print_length
+    truncated = n is not None and len(obj) > n
+    if not truncated and printervars.print_escape and reprable(obj):
+        return repr(obj)
+    level += 1
+    if t is dict:
+        items = ["%s: %s" % (flat_repr(k, level), flat_repr(v, level))
+                 for (k, v) in islice(obj.iteritems(), n)]
+    else:
+        items = [flat_repr(x, level) for x in islice(obj, n)]
+    if truncated:
+        items.append("...")
+    (prefix, suffix) = flat_delimiters[t]
+    if t is tuple and len(obj) == 1 and not truncated:
+        suffix = ",)"
+    return prefix + ", ".join(items) + suffix
+
+class PrintStream(CharposStream):
+    """An output stream that can pretty-print atoms (strings and numbers)
+    directly, and which creates a PrettyPrinter only when it is asked to
+    print some other kind of object.
+
+    Output is the same as if a PrettyPrinter had been used throughout; in
+    particular, trailing whitespace is held back until something else is
+    written after it."""
+
+    def __init__(self, stream, charpos=None):
+        if charpos is None:
+            try:
+                charpos = stream.charpos
+            except AttributeError:
+                charpos = 0
+        super(PrintStream, self).__init__(stream, charpos)
+        self.blankspace = ""    # trailing whitespace
+        self.pp = None
+
+    def write(self, str):
+        assert not self.closed, "I/O operation on closed stream"
+        if "\n" in str:
+            (before, newline, after) = str.partition("\n")
+            self.stream.write(self.blankspace + before)
+            self.blankspace = ""
+            self.terpri()
+            if after:
+                self.write(after)
+        else:
+            s = str.rstrip(" ")
+            if s:
+                self.stream.write(self.blankspace + s if self.blankspace \
+                                                     else s)
+                self.blankspace = str[len(s):]
+            else:
+                self.blankspace += str
+            self.charpos += len(str)
+
+    def terpri(self):
+        assert not self.closed, "I/O operation on closed stream"
+        self.stream.write(self.blankspace + "\n")
+        self.blankspace = ""
+        self.charpos = 0
+
+    def pprint(self, obj):
+        """Pretty-print the given object."""
+        if type(obj) in atom_types and type(obj) not in printers and \
+                printervars.print_budget is None:
+            self.write(printed_string(obj) if isinstance(obj, basestring) \
+                           else printed_number(obj))
+            return
+
+        # Hand off to a real pretty printer, starting where we are now.
+        self.stream.write(self.blankspace)
+        self.blankspace = ""
+        pp = self.pp
+        if pp is None:
+            pp = self.pp = PrettyPrinter(self.stream, charpos=self.charpos)
+            pp.printing = True  # let truncation propagate to our caller
+        else:
+            pp.space = pp.margin - self.charpos
+        try:
+            pp.pprint(obj)
+        finally:
+            self.blankspace = pp.blankspace
+            pp.blankspace = ""
+            self.charpos = pp.charpos
+
+def head(seq):
+    """Return a list of (at most) the first print_length + 1 elements of
+    the given array; the extra element lets LogicalBlock know that there
+    are more to come."""
+    n = printervars.print_length
+    return seq.tolist() if n is None or len(seq) <= n \
+                        else seq[:n + 1].tolist()
+
+def memoryview_head(view):
+    """Like head, but for a memoryview, whose elements are decoded from the
+    bytes of just the ones returned.  Returns None if they can't be
+    decoded, e.g., if the view has more than one dimension."""
+    if view.ndim != 1:
+        return None
+    n = printervars.print_length
+    if n is not None and len(view) > n:
+        view = view[:n + 1]
+    try:
+        return view.tolist()
+    except NotImplementedError:
+        pass
+    # Python 2 only converts byte views to lists; unpack the others.
+    import struct
+    (order, code) = (view.format[:1], view.format[1:]) \
+                        if view.format[:1] in "@=<>!" else ("", view.format)
+    if len(code) != 1:
+        return None
+    try:
+        return list(struct.unpack("%s%d%s" % (order, len(view), code),
+                                  view.tobytes()))
+    except struct.error:
+        return None
+
 def pprint(obj, *args, **kwargs):
     pp = PrettyPrinter(*args, **kwargs)
     with bindings(printervars, print_pretty=True):
         pp.pprint(obj)
     pp.terpri()
     pp.close()
+
+def pprint_to(stream, obj, width, printer_vars):
+    """Pretty-print obj to stream, with the given printer variables bound,
+    and without a final newline."""
+    variables = {"print_pretty": True}
+    variables.update(printer_vars)
+    with bindings(printervars, **variables):
+        pp = PrettyPrinter(stream, width=width)
+        pp.pprint(obj)
+    pp.close()
+
+def check_printer_vars(printer_vars):
+    for name in printer_vars:
+        if not hasattr(printervars, name):
+            raise TypeError("unknown printer variable %s" % name)
+
+def pformat(obj, width=None, **printer_vars):
+    """Return the pretty-printed representation of obj as a string, with
+    the right margin at width characters and the given printer variables
+    (e.g., print_length=10) bound."""
+    check_printer_vars(printer_vars)
+    sink = StringSink()
+    pprint_to(sink, obj, width, printer_vars)
+    return sink.getvalue()
+
+def iter_pformat(obj, width=None, chunk_size=4096, **printer_vars):
+    """Like pformat, but generate the output in chunks (usually lines) as
+    soon as the pretty printer has committed to them.  The printing is
+    done in another thread, which runs only while the consumer is waiting
+    for the next chunk, and stops if the consumer does.  The printer
+    variables are bound only while it runs.
+
+    Each chunk costs a handoff between the two threads, so consuming all
+    of the output takes about 1.5-2 times as long as pformat (e.g., 0.27s
+    against 0.15s for 1800 lines); use this when the first lines are
+    wanted early, or the consumer may not want them all."""
+    check_printer_vars(printer_vars)
+    return iter_output(lambda stream: pprint_to(stream, obj, width,
+                                                printer_vars),
+                       chunk_size, printervars)
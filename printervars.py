@@ -1,7 +1,14 @@
 """Printer control variables, a la Common Lisp."""
 
+print_budget = None
+print_bytes = None
 print_escape = True
 print_length = None
 print_level = None
+print_lines = None
+print_lookahead = None
 print_pretty = True
 print_right_margin = None
+print_string_length = None
+print_string_tail = None
+print_trace = None
@@ -0,0 +1,251 @@
+"""A local formatting service.
+
+Short-lived processes pay for importing this package and for parsing
+their control strings every time they start.  A long-running server can
+pay those costs once: it listens on a UNIX domain socket, and formats or
+pretty-prints on behalf of its clients using its warm cache of Formatter
+instances.  Start one with
+
+    python -m prettyprinter.server [--socket PATH]
+
+and talk to it with a Client:
+
+    client = Client()
+    client.format("~D item~:P", 3)
+    client.pprint(obj, width=100, print_length=10)
+
+Requests and responses are length-prefixed pickles.  Since unpickling
+data from an untrusted source is unsafe, the socket is accessible only by
+the user running the server, and lives by default in a directory that
+only that user can use ($XDG_RUNTIME_DIR/prettyprinter, or failing that,
+prettyprinter-UID in the temporary directory).  Clients refuse to talk to
+a socket owned by anyone else.
+
+The printer variables are module globals, so requests are formatted one at
+a time; since formatting is CPU-bound, this costs little.  The output of a
+request is sent back to the client in chunks once it's been produced and
+the next request may proceed, so that a client that stops reading holds
+up only itself."""
+
+from __future__ import with_statement
+
+import errno
+import os
+import socket
+import stat
+import struct
+import tempfile
+import threading
+import cPickle as pickle
+from SocketServer import ThreadingMixIn, UnixStreamServer, StreamRequestHandler
+from bindings import bindings
+from format import format
+from prettyprinter import PrettyPrinter
+from sinks import StringSink
+import printervars
+
+__all__ = ["Client", "FormatServer", "ServerError", "default_socket"]
+
+header = struct.Struct("!I")    # frame length
+chunk_size = 1 << 16            # output bytes per response frame
+
+def private_directory():
+    """Return a directory that only the current user may use, creating it
+    if necessary."""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        path = os.path.join(runtime, "prettyprinter")
+    else:
+        path = os.path.join(tempfile.gettempdir(),
+                            "prettyprinter-%d" % os.getuid())
+    try:
+        os.mkdir(path, 0700)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or \
+            st.st_mode & 0077:
+        raise OSError(errno.EPERM, "not a private directory", path)
+    return path
+
+def default_socket():
+    """Return the default socket path for the current user."""
+    return os.path.join(private_directory(), "server.sock")
+
+def check_socket(path):
+    """Raise OSError unless path is a socket owned by the current user."""
+    st = os.lstat(path)
+    if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+        raise OSError(errno.EPERM, "not a socket owned by the current user",
+                      path)
+
+def remove_socket(path):
+    """Remove a stale socket, refusing to remove anything else."""
+    if os.path.lexists(path):
+        check_socket(path)
+        os.unlink(path)
+
+def send_frame(sock, obj):
+    data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    sock.sendall(header.pack(len(data)) + data)
+
+def recv_exactly(stream, n):
+    data = stream.read(n)
+    if len(data) < n:
+        raise EOFError("connection closed")
+    return data
+
+def recv_frame(stream):
+    """Read a frame from a file-like object; return None at EOF."""
+    h = stream.read(header.size)
+    if not h:
+        return None
+    if len(h) < header.size:
+        raise EOFError("connection closed")
+    return pickle.loads(recv_exactly(stream, header.unpack(h)[0]))
+
+class ServerError(RuntimeError):
+    """An error that occurred while the server was handling a request."""
+
+    def __init__(self, type, message):
+        super(ServerError, self).__init__("%s: %s" % (type, message))
+        self.type = type
+
+def send_data(sock, data):
+    """Send data in ("data", string) frames of at most chunk_size
+    characters."""
+    for i in xrange(0, len(data), chunk_size):
+        send_frame(sock, ("data", data[i:i+chunk_size]))
+
+class FormatRequestHandler(StreamRequestHandler):
+    """Handle a sequence of requests on one connection.  Each request is
+    a tuple (operation, variables, ...), where variables is a dictionary
+    of printer variable bindings, and is one of:
+
+        ("format", variables, control, args)
+        ("pprint", variables, obj, width)
+
+    The response is zero or more ("data", string) frames, followed by
+    either ("ok",) or ("error", type name, message)."""
+
+    def handle(self):
+        while True:
+            request = recv_frame(self.rfile)
+            if request is None:
+                break
+            # Nothing is sent while the lock is held, since the client
+            # might not be reading.
+            output = StringSink()
+            try:
+                with self.server.lock:
+                    self.dispatch(output, *request)
+            except Exception, e:
+                response = ("error", type(e).__name__, str(e))
+            else:
+                response = ("ok",)
+            send_data(self.request, output.getvalue())
+            send_frame(self.request, response)
+
+    def dispatch(self, stream, operation, variables, *args):
+        for name in variables:
+            if not hasattr(printervars, name):
+                raise NameError("unknown printer variable %s" % name)
+        with bindings(printervars, **variables):
+            if operation == "format":
+                (control, args) = args
+                format(stream, control, *args)
+            elif operation == "pprint":
+                (obj, width) = args
+                pp = PrettyPrinter(stream,
+                                   width=width or \
+                                       printervars.print_right_margin or 80)
+                pp.pprint(obj)
+                pp.close()
+            else:
+                raise ValueError("unknown operation %r" % operation)
+
+class FormatServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path=None):
+        self.path = path or default_socket()
+        remove_socket(self.path)
+        self.lock = threading.Lock()
+        mask = os.umask(0177)   # socket mode 0600
+        try:
+            UnixStreamServer.__init__(self, self.path, FormatRequestHandler)
+        finally:
+            os.umask(mask)
+
+    def server_close(self):
+        UnixStreamServer.server_close(self)
+        remove_socket(self.path)
+
+class Client(object):
+    """A connection to a formatting server."""
+
+    def __init__(self, path=None):
+        path = path or default_socket()
+        check_socket(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.rfile = self.sock.makefile("rb")
+
+    def request(self, *request):
+        """Send a request, and generate the chunks of its output."""
+        send_frame(self.sock, request)
+        while True:
+            response = recv_frame(self.rfile)
+            if response is None:
+                raise EOFError("connection closed")
+            elif response[0] == "data":
+                yield response[1]
+            elif response[0] == "ok":
+                return
+            else:
+                raise ServerError(*response[1:])
+
+    def iter_format(self, control, *args, **variables):
+        """Format the arguments according to the control string, with the
+        given printer variables bound, and generate the output in chunks."""
+        return self.request("format", variables, control, args)
+
+    def format(self, control, *args, **variables):
+        """Format the arguments and return the output as a string."""
+        return "".join(self.iter_format(control, *args, **variables))
+
+    def iter_pprint(self, obj, width=None, **variables):
+        return self.request("pprint", variables, obj, width)
+
+    def pprint(self, obj, width=None, **variables):
+        """Pretty-print obj, and return the output as a string."""
+        return "".join(self.iter_pprint(obj, width, **variables))
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main(argv=None):
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description="Run a local formatting server.")
+    parser.add_argument("--socket",
+                        help="path of the UNIX socket (default: server.sock "
+                        "in a private runtime directory)")
+    options = parser.parse_args(argv)
+    server = FormatServer(options.socket or default_socket())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""Output streams for writing large amounts of pretty-printed output directly
+to a file descriptor, bypassing the file object layer, or to memory.
+
+All of the classes here are ordinary write-only streams, and may be passed
+as the stream argument to PrettyPrinter or CharposStream (or used as a
+format destination)."""
+
+import os
+import sys
+
+__all__ = ["FileDescriptorStream", "MmapStream", "StringSink", "iter_output"]
+
+iov_max = 1024 # maximum number of buffers per writev
+
+class FileDescriptorStream(object):
+    """An output stream that gathers the strings written to it and sends
+    them to a file descriptor in batches, using a single writev(2) (or,
+    where that's not available, a single write(2)) per batch."""
+
+    def __init__(self, fd, batch_size=4096, encoding="utf-8", closefd=False):
+        """Write to fd, which may be a file descriptor or any object with
+        a fileno method.  Output is sent whenever batch_size strings have
+        accumulated.  Unicode strings are encoded with the given encoding.
+        If closefd is true, the file descriptor is closed when the stream
+        is."""
+        self.fd = fd if isinstance(fd, (int, long)) else fd.fileno()
+        self.batch_size = batch_size
+        self.encoding = encoding
+        self.closefd = closefd
+        self.closed = False
+        self.chunks = []
+
+    @classmethod
+    def open(cls, filename, mode=0666, **kwargs):
+        """Open (creating or truncating) the named file for writing."""
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        return cls(fd, closefd=True, **kwargs)
+
+    def fileno(self):
+        return self.fd
+
+    def write(self, str):
+        assert not self.closed, "I/O operation on closed stream"
+        chunks = self.chunks
+        chunks.append(str)
+        if len(chunks) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        assert not self.closed, "I/O operation on closed stream"
+        if not self.chunks:
+            return
+        # Encode each chunk separately, since str and unicode chunks that
+        # aren't pure ASCII can't be joined.
+        chunks = [chunk.encode(self.encoding) \
+                      if isinstance(chunk, unicode) else chunk \
+                      for chunk in self.chunks]
+        if hasattr(os, "writev"):
+            for i in xrange(0, len(chunks), iov_max):
+                batch = chunks[i:i + iov_max]
+                n = os.writev(self.fd, batch)
+                if n < sum([len(chunk) for chunk in batch]):
+                    self.write_all("".join(batch)[n:])
+        else:
+            self.write_all("".join(chunks))
+        self.chunks = []        # only once they've all been written
+
+    def write_all(self, data):
+        """Write all of the given data, retrying after partial writes."""
+        while data:
+            n = os.write(self.fd, data)
+            data = data[n:]
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self.closed = True
+            if self.closefd:
+                os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class MmapStream(object):
+    """An output stream that writes into a memory-mapped file.
+
+    The file is preallocated, and grown (by doubling) as needed; when the
+    stream is closed, it is truncated to the length actually written."""
+
+    def __init__(self, filename, size=1 << 24, encoding="utf-8", mode=0666):
+        import mmap
+        self.fd = os.open(filename, os.O_RDWR | os.O_CREAT | os.O_TRUNC, mode)
+        self.size = max(int(size), mmap.PAGESIZE)
+        self.encoding = encoding
+        self.closed = False
+        os.ftruncate(self.fd, self.size)
+        self.map = mmap.mmap(self.fd, self.size)
+
+    def fileno(self):
+        return self.fd
+
+    def write(self, str):
+        assert not self.closed, "I/O operation on closed stream"
+        try:
+            self.map.write(str)
+        except ValueError:
+            # Either we're out of room, or we've got a unicode string
+            # that can't be implicitly encoded.
+            if isinstance(str, unicode):
+                str = str.encode(self.encoding)
+            self.grow(self.map.tell() + len(str))
+            self.map.write(str)
+
+    def grow(self, size):
+        """Enlarge the file & mapping to at least size bytes."""
+        while self.size < size:
+            self.size *= 2
+        self.map.resize(self.size)
+
+    def flush(self):
+        assert not self.closed, "I/O operation on closed stream"
+        self.map.flush()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            end = self.map.tell()
+            self.map.flush()
+            self.map.close()
+            os.ftruncate(self.fd, end)
+            os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class StringSink(object):
+    """An output stream that collects the strings written to it in a list,
+    and joins them only when its value is asked for.  Unlike a StringIO,
+    it accepts any mixture of str and unicode strings.  If str strings
+    that aren't pure ASCII are mixed with unicode ones, the value is a
+    str, with the unicode strings encoded with the given encoding."""
+
+    def __init__(self, encoding="utf-8"):
+        self.encoding = encoding
+        self.chunks = []
+        self.write = self.chunks.append
+
+    @property
+    def charpos(self):
+        """The position of the next character relative to the beginning of
+        the current line."""
+        n = 0
+        for chunk in reversed(self.chunks):
+            newline = chunk.rfind("\n")
+            if newline != -1:
+                return n + len(chunk) - (newline + 1)
+            n += len(chunk)
+        return n
+
+    def getvalue(self):
+        chunks = self.chunks
+        if len(chunks) > 1:
+            try:
+                value = "".join(chunks)
+            except UnicodeDecodeError:
+                value = "".join([chunk.encode(self.encoding) \
+                                     if isinstance(chunk, unicode) else chunk \
+                                     for chunk in chunks])
+            chunks[:] = [value]
+        return chunks[0] if chunks else ""
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class Abandoned(Exception):
+    """Raised in the producer thread of iter_output when the consumer has
+    stopped consuming."""
+    pass
+
+def snapshot(namespace):
+    """Return the values of the public variables in namespace."""
+    return dict((name, value) for (name, value) in vars(namespace).items()
+                if not name.startswith("_"))
+
+class QueueSink(object):
+    """An output stream that hands the strings written to it over to a
+    consumer thread, in chunks that end with a newline or are at least
+    chunk_size long.  The producer and the consumer take turns: the
+    producer runs only while the consumer is waiting for the next chunk.
+    If a namespace is given, its variables are switched along with them,
+    so that each thread sees only its own bindings."""
+
+    def __init__(self, chunk_size, namespace=None):
+        from Queue import Queue
+        self.requests = Queue(1)
+        self.replies = Queue(1)
+        self.chunk_size = chunk_size
+        self.namespace = namespace
+        self.consumer_vars = self.producer_vars = None
+        self.chunks = []
+        self.size = 0
+        self.abandoned = False
+
+    def write(self, str):
+        if self.abandoned:
+            raise Abandoned()
+        newline = str.rfind("\n")
+        if newline == -1:
+            self.chunks.append(str)
+            self.size += len(str)
+            if self.size >= self.chunk_size:
+                self.flush()
+        else:
+            self.chunks.append(str[:newline+1])
+            self.flush()
+            if newline + 1 < len(str):
+                self.chunks.append(str[newline+1:])
+                self.size = len(str) - (newline + 1)
+
+    def flush(self):
+        if self.abandoned:
+            raise Abandoned()
+        if self.chunks:
+            chunk = "".join(self.chunks)
+            self.chunks = []
+            self.size = 0
+            self.reply(chunk)
+            self.wait()
+
+    # Called in the producer thread.
+
+    def wait(self):
+        """Wait for the consumer to ask for another chunk, then switch to
+        the producer's variables.  Raise Abandoned if the consumer won't."""
+        more = self.requests.get()
+        if self.namespace:
+            self.consumer_vars = snapshot(self.namespace)
+            if self.producer_vars is not None:
+                vars(self.namespace).update(self.producer_vars)
+        if not more:
+            self.abandoned = True
+            raise Abandoned()
+
+    def reply(self, chunk, exc_info=None):
+        """Switch back to the consumer's variables, and hand it a chunk
+        (None at the end of the output) or an exception."""
+        if self.namespace:
+            self.producer_vars = snapshot(self.namespace)
+            vars(self.namespace).update(self.consumer_vars)
+        self.replies.put((chunk, exc_info))
+
+    # Called in the consumer thread.
+
+    def next(self):
+        self.requests.put(True)
+        return self.replies.get()
+
+    def abandon(self):
+        self.requests.put(False)
+        self.replies.get()
+
+def iter_output(produce, chunk_size=4096, namespace=None):
+    """Call produce(stream) in another thread, and generate what it writes
+    to stream in chunks: one per line, or per chunk_size characters of a
+    long line.  The producer runs only while the consumer is waiting for
+    a chunk, and any bindings it makes to the variables in namespace (e.g.,
+    the printervars module) are in effect only while it runs.  Exceptions
+    raised by produce are re-raised in the consumer.  If the consumer stops
+    early (by closing the generator, or by dropping it), the producer is
+    unwound at its next write before the generator is finished closing.
+    Handing each chunk from one thread to the other is not free, so this
+    is slower than writing to a StringSink when all of the output is
+    wanted."""
+    from threading import Thread
+    sink = QueueSink(chunk_size, namespace)
+
+    def run():
+        try:
+            sink.wait()
+            produce(sink)
+            sink.flush()
+        except Abandoned:
+            pass
+        except:
+            sink.reply(None, sys.exc_info())
+            return
+        sink.reply(None)
+
+    thread = Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    done = False
+    try:
+        while True:
+            (chunk, exc_info) = sink.next()
+            if chunk is None:
+                done = True
+                if exc_info:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                return
+            yield chunk
+    finally:
+        if not done:
+            sink.abandon()
@@ -0,0 +1,104 @@
+"""Generated structural printers.
+
+A structural printer prints an object as Name(field=value, ...), like the
+repr of a namedtuple.  Rather than looping over the field names at print
+time, structural_printer generates (via exec) a function specialized for
+the given class, with the field accesses compiled in, and registers it in
+the pretty printer's type-indexed table of printers, e.g.,
+
+    @structural_printer
+    class Point(object):
+        __slots__ = ("x", "y")
+
+    Point = structural_printer(namedtuple("Point", "x y"))
+
+    structural_printer(Circle, ["center", "radius"])
+
+Printers are looked up by exact type; subclasses must be registered
+separately."""
+
+import keyword
+import re
+from prettyprinter import printers
+import printervars
+
+__all__ = ["structural_printer", "fields"]
+
+identifier = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def slots(cls):
+    """Return the names in the __slots__ of cls itself (not its bases)."""
+    names = cls.__dict__.get("__slots__", ())
+    return (names,) if isinstance(names, basestring) else names
+
+def fields(cls):
+    """Return the field names for a namedtuple class or a class with
+    __slots__."""
+    if issubclass(cls, tuple) and hasattr(cls, "_fields"):
+        return list(cls._fields)
+    names = []
+    for c in reversed(cls.__mro__):
+        names.extend([name for name in slots(c) \
+                          if name not in ("__dict__", "__weakref__") and \
+                              name not in names])
+    if not names:
+        raise TypeError("can't determine the fields of %s" % cls.__name__)
+    return names
+
+def accessor(cls, name):
+    """Return an expression that accesses the named field of obj."""
+    if name.startswith("__") and not name.endswith("__"):
+        # Private names in __slots__ are mangled with the name of the class
+        # whose __slots__ they're in, which may be a base class.
+        owner = cls
+        for c in cls.__mro__:
+            if name in slots(c):
+                owner = c
+                break
+        mangled = "_%s%s" % (owner.__name__.lstrip("_"), name)
+        if hasattr(cls, mangled):
+            name = mangled
+    if identifier.match(name) and not keyword.iskeyword(name):
+        return "obj.%s" % name
+    else:
+        return "getattr(obj, %r)" % name
+
+def generate(cls, names):
+    """Generate the source of a printer function for the given class."""
+    code = ["def printer(pp, obj):",
+            "    if printervars.print_level is not None and \\",
+            "            pp.level >= printervars.print_level:",
+            "        pp.write('#')",
+            "        return",
+            "    length = printervars.print_length",
+            "    pretty = printervars.print_pretty",
+            "    pp.begin(prefix=%r, suffix=')')" % (cls.__name__ + "("),
+            "    while True:"]
+    for (i, name) in enumerate(names):
+        if i > 0:
+            code += ["        pp.write(', ')",
+                     "        if pretty:",
+                     "            pp.newline(fill=True)"]
+        code += ["        if length == %d:" % i,
+                 "            pp.write('...')",
+                 "            break",
+                 "        pp.write(%r)" % (name + "="),
+                 "        pp.pprint(%s)" % accessor(cls, name)]
+    code += ["        break",
+             "    pp.end(suffix=')')"]
+    return "\n".join(code) + "\n"
+
+def structural_printer(cls, names=None):
+    """Generate and register a structural printer for the given class,
+    which will print the given field names (by default, the namedtuple
+    fields or slots of the class).  Returns the class, so that this may
+    be used as a class decorator."""
+    names = fields(cls) if names is None else list(names)
+    printer = printers.get(cls)
+    if getattr(printer, "fields", None) != names:
+        namespace = {"printervars": printervars, "getattr": getattr}
+        exec generate(cls, names) in namespace
+        printer = namespace["printer"]
+        printer.fields = names
+        printers[cls] = printer
+    return cls
@@ -0,0 +1,70 @@
+"""Memory use of the pretty printer on an unbounded stream.
+
+Streams n records (by default, 10^8) from a generator through a single
+logical block to /dev/null, printing each one via begin, write, newline,
+and end, and checks that the peak resident set size stops growing once
+the printer has warmed up.  Every tenth record is empty, so that there
+are zero-width tokens for print_lookahead to bound.  This takes a long
+time at the default size; pass a smaller n to try it out:
+
+    python stress_streaming.py 1000000"""
+
+from __future__ import with_statement
+import os
+import resource
+import sys
+import time
+from bindings import bindings
+from prettyprinter import PrettyPrinter
+import printervars
+
+def maxrss():
+    """Return the peak resident set size of this process."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def records(n, interval, checkpoint):
+    """Generate n records, calling checkpoint every interval records."""
+    for i in xrange(n):
+        if i % interval == 0:
+            checkpoint(i)
+        if i % 10 == 0:
+            yield ()
+        else:
+            yield (i, "record %d" % i)
+
+def stream(pp, records):
+    with pp.logical_block(records, prefix="[", suffix="]") as l:
+        for fields in l:
+            pp.begin(prefix="(", suffix=")")
+            for (j, field) in enumerate(fields):
+                if j > 0:
+                    pp.write(", ")
+                    pp.newline()
+                pp.write(str(field))
+            pp.end(suffix=")")
+            l.exit_if_list_exhausted()
+            pp.write(", ")
+            pp.newline(fill=True)
+
+def main(n=10**8):
+    samples = []
+    def checkpoint(i):
+        samples.append((i, maxrss(), len(pp.queue), len(pp.scanstack)))
+        if len(samples) % 10 == 1:
+            print "%12d records  maxrss %8d  queue %4d  scan stack %d" % \
+                samples[-1]
+            sys.stdout.flush()
+    start = time.time()
+    with bindings(printervars, print_lookahead=1000):
+        pp = PrettyPrinter(open(os.devnull, "w"), width=80)
+        stream(pp, records(n, max(n // 100, 1), checkpoint))
+        pp.close()
+    print "%d records in %.1f sec" % (n, time.time() - start)
+    (warm, final) = (samples[min(1, len(samples) - 1)][1], maxrss())
+    print "maxrss after warm-up %d, at end %d" % (warm, final)
+    assert final <= warm * 1.01 + 1024, "memory use grew with the input"
+    assert max([q for (_, _, q, _) in samples]) <= 1001
+    assert max([s for (_, _, _, s) in samples]) <= 4
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,74 @@
+from __future__ import with_statement
+import unittest
+from threading import Timer
+from bindings import bindings
+from budget import Budget, BudgetExceeded
+from format import format
+import printervars
+
+class BudgetTest(unittest.TestCase):
+    tree = [(i, ["x"] * i) for i in range(5)]
+
+    def formatBudget(self, budget, control, *args):
+        with bindings(printervars, print_budget=budget):
+            return format(None, control, *args)
+
+    def testNodes(self):
+        # The control string itself counts as a node.
+        self.assertEqual(self.formatBudget(Budget(nodes=1), "~W", self.tree),
+                         "...")
+        self.assertEqual(self.formatBudget(Budget(nodes=2), "~W", self.tree),
+                         "[...]")
+        self.assertEqual(self.formatBudget(Budget(nodes=13), "~W", self.tree),
+                         "[(0, []), (1, ['x']), (2, ['x', ...])]")
+        self.assertEqual(self.formatBudget(Budget(nodes=3),
+                                           "~{~A~^, ~}", range(10)),
+                         "0, ...")
+        self.assertEqual(self.formatBudget(Budget(nodes=100), "~W",
+                                           self.tree),
+                         format(None, "~W", self.tree))
+
+    def testFastPaths(self):
+        # Simple iterations, fixed-arity and lowered control strings are
+        # charged just as if they had been interpreted.
+        budget = Budget(nodes=3)
+        self.assertEqual(self.formatBudget(budget, "~{~D~^, ~}", range(20)),
+                         "0, 1, ...")
+        self.assertEqual(budget.count, 4)
+        budget = Budget(nodes=2)
+        self.assertEqual(self.formatBudget(budget, "~D ~D ~D ~D ~D",
+                                           *range(5)),
+                         "0 1 2 3 4")
+        self.assertEqual(budget.count, 1)
+        self.assertEqual(self.formatBudget(Budget(nodes=0), "~D ~A", 1, "x"),
+                         "...")
+
+    def testError(self):
+        self.assertRaises(BudgetExceeded, self.formatBudget,
+                          Budget(nodes=5, error=True), "~W", self.tree)
+
+    def testDeadline(self):
+        budget = Budget(seconds=0)
+        s = self.formatBudget(budget, "~W", [range(10)] * 100)
+        self.assertTrue(s.endswith("...]]"))
+        self.assertEqual(budget.exhausted, "deadline passed")
+
+    def testCancel(self):
+        class Slow(object):
+            def __repr__(self):
+                budget.cancel() # as if from another thread
+                return "slow"
+        budget = Budget()
+        self.assertEqual(self.formatBudget(budget, "~W", [Slow()] * 3),
+                         "[slow, ...]")
+        budget = Budget()
+        timer = Timer(0.01, budget.cancel)
+        timer.start()
+        with bindings(printervars, print_budget=budget):
+            while budget.exhausted is None:
+                format(None, "~W", self.tree)
+        timer.join()
+        self.assertEqual(budget.exhausted, "cancelled")
+
+if __name__ == "__main__":
+    unittest.main()
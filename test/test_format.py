@@ -1,5 +1,6 @@
 import unittest
-from format import format, FormatError
+from format import format, format_many, Formatter, FormatError, \
+                   FormatParseError, parse_control_string
 
 class FormatTest(unittest.TestCase):
     def formatEquals(self, result, control, *args):
@@ -23,6 +24,17 @@ class FormatTest(unittest.TestCase):
         self.formatEquals("-000 1101 0000 0101", "~19,0,' ,4:B", -3333)
         self.formatEquals("1 22", "~3,,,' ,2:R", 17)
         self.formatEquals("6|55|35", "~,,'|,2:D", 0xFFFF)
+        self.formatEquals("0", "~B", 0)
+        self.formatEquals("0", "~7R", 0)
+        self.formatEquals("001", "~3,'0:D", 1)
+        self.formatEquals("0,001", "~5,'0:D", 1)
+        self.formatEquals("-0,001", "~6,'0:D", -1)
+
+    def testBigRadix(self):
+        n = 7**20000 + 3
+        for radix in (2, 3, 7, 8, 10, 16, 36):
+            self.assertEqual(n, int(format(None, "~VR", radix, n), radix))
+        self.assertEqual(n, int(format(None, "~:D", n).replace(",", "")))
 
     def testRomanNumerals(self):
         self.formatEquals("IV", "~@R", 4)
@@ -40,6 +52,9 @@ class FormatTest(unittest.TestCase):
         self.formatEquals("ninety", "~R", 90)
         self.formatEquals("ninetieth", "~:R", 90)
         self.formatEquals("negative nine hundred ninety-nine nonillion, nine hundred ninety-nine octillion, nine hundred ninety-nine septillion, nine hundred ninety-nine sextillion, nine hundred ninety-nine quintillion, nine hundred ninety-nine quadrillion, nine hundred ninety-nine trillion, nine hundred ninety-nine billion, nine hundred ninety-nine million, nine hundred ninety-nine thousand, nine hundred ninety-nine", "~R", -999999999999999999999999999999999)
+        self.formatEquals("one times ten to the thirty-sixth power plus", "~R", 10**36)
+        self.formatEquals("one thousandth", "~:R", 1000)
+        self.formatEquals("one thousand fiftieth", "~:R", 1050)
 
     def testTabulate(self):
         self.formatEquals(" foo", "~Tfoo")
@@ -101,6 +116,132 @@ class FormatTest(unittest.TestCase):
         self.formatEquals("Pairs: <a,1> <b,2> <c,3>.",
                           "Pairs:~:@{ <~A,~D>~}.", ("a", 1), ("b", 2), ("c", 3))
 
+    def testBatchedIteration(self):
+        from array import array
+        l = [1, -22, 333, 4444, 55555]
+        self.formatEquals("1, -22, 333, 4,444, 55,555", "~{~:D~^, ~}", l)
+        self.formatEquals("1, -22, 333, 4,444, 55,555",
+                          "~{~:D~^, ~}", array("l", l))
+        self.formatEquals("1, -22, 333, 4,444, 55,555", "~{~:D~^, ~}",
+                          tuple(l))
+        self.formatEquals("1, -22, 333, 4,444, 55,555, ",
+                          "~{~:D, ~}", l)
+        self.formatEquals("<   1> < -22> < 333> <4 444> ",
+                          "~4{<~4,' ,' :D>~^ ~}", l)
+        # Only the elements used are converted.
+        class Sequence(object):
+            def __init__(self, items):
+                self.items = items
+            def __len__(self):
+                return len(self.items)
+            def __getitem__(self, i):
+                return Sequence(self.items[i]) if isinstance(i, slice) \
+                                               else self.items[i]
+            def tolist(self):
+                converted.append(len(self.items))
+                return list(self.items)
+        converted = []
+        self.formatEquals("1 -22 ", "~2{~D~^ ~}", Sequence(l))
+        self.assertEqual(converted, [2])
+        self.formatEquals("0 1 2 ", "~3{~D~^ ~}", array("l", range(10000)))
+        self.formatEquals("1/-22.333/4444", "~{~D/~D~^.~}", l[:4])
+        self.formatEquals("1/-10110, 333/1000101011100",
+                          "~{~D/~B~^, ~}", l[:4])
+        self.formatEquals("x: 1 2 3", "x:~@{ ~D~}", 1, 2, 3)
+        self.formatEquals("one two three", "~{~R~^ ~}", [1, 2, 3])
+        self.formatEquals("", "~0{~D~^, ~}", l)
+        self.formatEquals("", "~{~D~^, ~}", [])
+        self.formatRaises(StopIteration, "~{~D/~D.~}", l)
+
+    def testArgumentPlan(self):
+        for control in ["~A ~S ~D", "~D tr~:@P", "~{~A~^, ~}", "~:[no~;yes~]",
+                        "~<~A~:_~A~:>", "~(~A ~A~)", "~? ~D", "~5,'0D~%"]:
+            self.assertNotEqual(None, Formatter(control).plan, control)
+        for control in ["~*~A", "~:*~A", "~@*~A", "~VD", "~#D", "~A~^~A",
+                        "~@?", "~@{~A~}", "~@[~A~]", "~:[~A~;~]", "~:P"]:
+            self.assertEqual(None, Formatter(control).plan, control)
+        self.assertEqual(4, Formatter("~A ~:[~A~;~A~] ~(~A~)").arity)
+        self.assertEqual(3, Formatter("~A ~[~A~;~A~:;~A~]").arity)
+        self.formatRaises(FormatError, "~A ~A", 1)
+        self.formatEquals("1 2", "~A ~A", 1, 2, 3)
+
+    def testFormatMany(self):
+        from cStringIO import StringIO
+        from charpos import CharposStream
+        rows = [("a", 1, "x"), ("b", 22, 3.5), (None, 3L, "\n"),
+                ([1, 2], 4, {}), ("c", -7, "e"), ("f", 5, 6, 7)]
+        for control in ["~A,~D,~S~%", "~A ~5D ~S;", "~A~^ ~D~^ ~S  ",
+                        "~@<~A~:_~A~:> ~A", "~A~20T~A~%"]:
+            expected = [format(None, control, *row) for row in rows]
+            self.assertEqual(expected, format_many(None, control, rows))
+            s = StringIO()
+            Formatter(control).map(s, iter(rows), batch_size=4)
+            self.assertEqual("".join(expected), s.getvalue())
+            s = StringIO()
+            for row in rows:
+                format(CharposStream(s), control, *row)
+            expected = s.getvalue()
+            s = StringIO()
+            format_many(CharposStream(s), control, rows)
+            self.assertEqual(expected, s.getvalue())
+        self.assertRaises(FormatError, format_many, None, "~A ~A", [(1,)])
+
+    def testIter(self):
+        control = "~{~A~^~%~}"
+        args = ([range(i % 5) for i in range(50)],)
+        chunks = list(Formatter(control).iter(args))
+        self.assertEqual(len(chunks), 50)
+        self.assertEqual("".join(chunks), format(None, control, *args))
+        self.assertEqual(list(Formatter("~A~%~A").iter((1, 2))),
+                         ["1\n", "2"])
+        self.assertRaises(FormatError, list, Formatter("~A ~A").iter((1,)))
+
+    def testCachedFormatters(self):
+        # Formatters are cached by control string, so they must be
+        # reusable: nothing may be consumed by the first call.
+        for (control, args, result) in \
+                [("~<~A and ~A~:@>", ([1, 2],), "1 and 2"),
+                 ("~@<~A ~A~:@>", (1, 2), "1 2"),
+                 ("~{~A~^, ~}", ([1, 2],), "1, 2"),
+                 ("~:[no~;yes~]", (True,), "yes"),
+                 ("~:(~A~)", ("ab cd",), "Ab Cd")]:
+            for i in range(2):
+                self.formatEquals(result, control, *args)
+
+    def testLazyImports(self):
+        import os, subprocess, sys
+        code = "import format, sys; print sorted(set(sys.modules) & " \
+            "set(['unicodedata', 'fcntl', 'termios', 'threading', " \
+            "'Queue', 'mmap', 'hexdump']))"
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output([sys.executable, "-c", code],
+                                         cwd=root)
+        self.assertEqual(output.strip(), "[]")
+        self.assertEqual(format(None, "~@C", u"\xe9"),
+                         'u"\\N{LATIN SMALL LETTER E WITH ACUTE}"')
+
+    def testParseErrors(self):
+        for (control, index, message) in \
+                [("~:@:A", 4, "too many colons"),
+                 ("abc~@:@A", 7, "too many at-signs"),
+                 ("~Z", 2, "unknown format directive"),
+                 ("~5,'0", 5, "incomplete format directive"),
+                 ("~{~A~:@@}", 8, "too many at-signs"),
+                 ("~:[~A~;~A~;~A~]", 3, "must specify exactly two sections")]:
+            try:
+                parse_control_string(control)
+            except FormatParseError, e:
+                self.assertEqual((e.args[0], e.args[-1] - e.offset),
+                                 (message, index))
+            else:
+                self.fail("no error parsing %r" % control)
+
+    def testParseNesting(self):
+        control = "~{" * 2000 + "~A" + "~}" * 2000
+        (iteration,) = parse_control_string(control)
+        self.assertEqual((iteration.start, iteration.end), (0, len(control)))
+        self.assertEqual(format(None, "~{~{~A~}~}", [[1, 2], [3]]), "123")
+
     def testPlural(self):
         pluralstr = "~D tr~:@P/~D win~:P"
         self.formatEquals("7 tries/1 win", pluralstr, 7, 1)
@@ -128,6 +269,13 @@ class FormatTest(unittest.TestCase):
         self.formatEquals("/hot .../hamburger",
                           "~:{/~A~#:^ ...~}", foods)
 
+        # Escapes from within nested directives.
+        self.formatEquals("x", "x~(abc~^def~)y")
+        self.formatEquals("1-2-3", "~{~A~#[~^~:;~]-~}", [1, 2, 3])
+        self.formatEquals("1+2.", "~{~A~@?~}.", [1, "~^+", 2, "~^-"])
+        self.formatEquals("1!2", "~:{~A~@<~:^!~:>~}", [[1], [2]])
+        self.formatEquals("[12][3", "~:{~@<[~A~:^~A]~:>~}", [[1, 2], [3, 4]])
+
     def testItems(self):
         """Exercises conditionals, iteration, and escapes."""
         items = "Items:~#[ none~; ~S~; ~S and ~S~:;~@{~#[~; and~] ~S~^,~}~]."
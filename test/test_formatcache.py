@@ -0,0 +1,116 @@
+import marshal
+import os
+import shutil
+import tempfile
+import unittest
+import format
+from format import format as fmt, formatters, pickled_formatters
+from formatcache import prewarm, load, dumps, loads
+
+class FormatCacheTest(unittest.TestCase):
+    cases = [("~A ~S ~D", "a", "b", 3),
+             ("~R and ~:R", 42, 3),
+             ("~@R ~:@R", 1990, 4),
+             ("~D tr~:@P/~D win~:P", 1, 3),
+             ("~V,'0D|~5,'*@D", 4, 7, 8),
+             ("~{~D~^, ~}", range(5)),
+             ("~:{<~A ~D>~}", [("a", 1), ("b", 2)]),
+             ("~<~:(~A~) street goes to ~:(~A~).~:@>", ["main", "boston"]),
+             ("~@<;; ~@;~A ~:_~A~:>", "first", "second"),
+             ("~:[no~;yes~] ~#[none~;one~:;many~]", True, 1, 2),
+             ("~(~A~)~3%~A~^~A", "X", "y"),
+             ("Done.~^ ~D warning~:P.", 3),
+             (u"unicode ~A", "x")]
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "format.cache")
+        self.saved = (dict(formatters), dict(pickled_formatters))
+        self.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        self.clear()
+        formatters.update(self.saved[0])
+        pickled_formatters.update(self.saved[1])
+
+    def clear(self):
+        formatters.clear()
+        pickled_formatters.clear()
+
+    def controls(self):
+        return [case[0] for case in self.cases]
+
+    def testRoundTrip(self):
+        for case in self.cases:
+            f = loads(dumps(format.Formatter(case[0])))
+            for i in range(2):
+                self.assertEqual(fmt(None, f, *case[1:]),
+                                 fmt(None, case[0], *case[1:]))
+
+    def testPrewarm(self):
+        expected = [fmt(None, *case) for case in self.cases]
+        self.clear()
+        prewarm(self.controls(), self.path)
+        self.assertEqual(sorted(load(self.path)), sorted(self.controls()))
+        self.assertEqual(len(formatters), len(self.cases))
+
+        # As if in a new process: nothing is parsed.
+        self.clear()
+        mtime = os.stat(self.path).st_mtime
+        def parse(control, start=0):
+            self.fail("parsed %r" % control)
+        (format.parse_control_string, parse) = \
+            (parse, format.parse_control_string)
+        try:
+            prewarm(self.controls(), self.path)
+            self.assertEqual(len(formatters), 0)
+            self.assertEqual([fmt(None, *case) for case in self.cases],
+                             expected)
+        finally:
+            format.parse_control_string = parse
+        self.assertEqual(os.stat(self.path).st_mtime, mtime)
+
+        # New control strings are added to the cache.
+        prewarm(["~A!"], self.path)
+        self.assertEqual(len(load(self.path)), len(self.cases) + 1)
+
+    def testLimit(self):
+        expected = [fmt(None, *case) for case in self.cases]
+        self.clear()
+        (format.max_cached_formatters, limit) = \
+            (3, format.max_cached_formatters)
+        try:
+            prewarm(self.controls(), self.path)
+            self.assertEqual(len(formatters), 3)
+            for i in range(2):
+                self.assertEqual([fmt(None, *case) for case in self.cases],
+                                 expected)
+                self.assertEqual(len(formatters), 3)
+        finally:
+            format.max_cached_formatters = limit
+
+    def testStale(self):
+        prewarm(self.controls(), self.path)
+        with open(self.path, "wb") as f:
+            marshal.dump(("old version", {"~A": "junk"}), f)
+        self.assertEqual(load(self.path), {})
+        self.clear()
+        prewarm(["~A"], self.path)
+        self.assertEqual(fmt(None, "~A", 1), "1")
+        self.assertEqual(load(self.path).keys(), ["~A"])
+        with open(self.path, "wb") as f:
+            f.write("garbage")
+        self.assertEqual(load(self.path), {})
+        self.assertEqual(load(os.path.join(self.dir, "missing")), {})
+
+    def testUntrusted(self):
+        prewarm(self.controls(), self.path)
+        os.chmod(self.path, 0666)
+        self.assertRaises(OSError, load, self.path)
+        self.clear()
+        self.assertRaises(OSError, prewarm, self.controls(), self.path)
+        self.assertEqual(len(pickled_formatters), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from hexdump import hexdump
+
+class HexdumpTest(unittest.TestCase):
+    def testHexdump(self):
+        self.assertEqual(list(hexdump("")), [])
+        self.assertEqual(list(hexdump("hello, world\n" * 2)),
+                         ["00000000  68 65 6c 6c 6f 2c 20 77 "
+                          "6f 72 6c 64 0a 68 65 6c  |hello, world.hel|",
+                          "00000010  6c 6f 2c 20 77 6f 72 6c "
+                          "64 0a                    |lo, world.|"])
+        self.assertEqual(list(hexdump(bytearray(range(8)), width=4)),
+                         ["00000000  00 01 02 03  |....|",
+                          "00000004  04 05 06 07  |....|"])
+
+    def testLength(self):
+        self.assertEqual(list(hexdump("abcdef", 3)),
+                         ["00000000  61 62 63" + 39 * " " + "  |abc|"])
+        self.assertEqual(list(hexdump("abcdef", 0)), [])
+
+    def testChunks(self):
+        data = bytearray(range(256)) * 3
+        self.assertEqual(list(hexdump(data)),
+                         list(hexdump(data, chunk_size=40)))
+        self.assertEqual(list(hexdump(data, 100)),
+                         list(hexdump(data, 100, chunk_size=7)))
+
+    def testItems(self):
+        import ctypes
+        # Buffers with multi-byte items are dumped byte by byte.
+        ints = (ctypes.c_int16 * 1000)(*range(1000))
+        matrix = (ctypes.c_int16 * 2 * 3)(*[(ctypes.c_int16 * 2)(i, -i)
+                                             for i in range(3)])
+        for (obj, length) in [(ints, 5), (ints, None), (matrix, None)]:
+            expected = list(hexdump(buffer(obj)[:], length))
+            self.assertEqual(list(hexdump(obj, length, chunk_size=7)),
+                             expected)
+            self.assertEqual(list(hexdump(memoryview(obj), length)),
+                             expected)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+from __future__ import with_statement
+import mmap
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from cStringIO import StringIO
+from bindings import bindings
+from literals import pprint_literals
+from prettyprinter import PrettyPrinter
+import printervars
+
+class LiteralsTest(unittest.TestCase):
+    def ppLiteralsEquals(self, result, data, width=80):
+        stream = StringIO()
+        pp = PrettyPrinter(stream, width=width)
+        pprint_literals(pp, data)
+        pp.close()
+        self.assertEqual(result, stream.getvalue())
+
+    def testJSON(self):
+        data = """{"name": "x, [y]: \\"z\\"",
+                   "values": [1, -2.5e3, true, false, null],
+                   "empty": {}}"""
+        self.ppLiteralsEquals('{"name": "x, [y]: \\"z\\"", '
+                              '"values": [1, -2.5e3, true, false, null], '
+                              '"empty": {}}', data)
+        self.ppLiteralsEquals("""\
+{"name": "x, [y]: \\"z\\"",
+ "values": [1, -2.5e3,
+            true, false,
+            null],
+ "empty": {}}""", data, width=28)
+        self.ppLiteralsEquals("[1]\n{}\n2", "[1] {}\n   2\n")
+
+    def testPython(self):
+        self.ppLiteralsEquals("{'a': (1,), u'b': set([1, 2L]), "
+                              "'c': Point(x=0x1F, y=())}",
+                              "{'a':(1,),u'b':set([1,2L]),"
+                              "'c':Point(x=0x1F,y=())}")
+        self.ppLiteralsEquals("['''a\n,]''', r'\\'']",
+                              "['''a\n,]''',r'\\'',]")
+
+    def testLimits(self):
+        data = "[1, [2, [3, [4]]], {'a': [5]}, 6]"
+        with bindings(printervars, print_length=2):
+            self.ppLiteralsEquals("[1, [2, [3, [4]]], ...]", data)
+        with bindings(printervars, print_length=1):
+            self.ppLiteralsEquals("[1, ...]", data)
+        with bindings(printervars, print_level=2):
+            self.ppLiteralsEquals("[1, [2, #], {'a': #}, 6]", data)
+
+    def testErrors(self):
+        for data in ("[1 2]", "[1,, 2]", "[1}", "[1, 2", "1]", "@"):
+            pp = PrettyPrinter(StringIO(), width=80)
+            self.assertRaises(ValueError, pprint_literals, pp, data)
+
+    def testLongStrings(self):
+        # Matching a string literal takes constant space, not space per
+        # character, so a multi-megabyte string fits in a small heap.
+        script = """if 1:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, (384 << 20, 384 << 20))
+            from literals import next_token
+            s = "x" * (8 << 20)
+            for q in ('"', "'", '\"\"\"', "'''"):
+                data = "%s%s\\n%s%s" % (q, s, s[:10], q)
+                if q in ('"', "'"):
+                    data = data.replace("\\n", "\\\\n")
+                assert next_token(data, 0).end() == len(data)
+            """
+        env = dict(os.environ,
+                   PYTHONPATH=os.pathsep.join(filter(None, sys.path)))
+        self.assertEqual(subprocess.call([sys.executable, "-c", script],
+                                         env=env), 0)
+
+    def testMmap(self):
+        with tempfile.TemporaryFile() as f:
+            f.write("[%s]" % ", ".join(map(str, range(1000))))
+            f.flush()
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            with bindings(printervars, print_length=3):
+                self.ppLiteralsEquals("[0, 1, 2, ...]", data)
+            data.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import logging
+from cStringIO import StringIO
+from logformat import FormattedMessage, FormatFormatter
+
+class Counted(object):
+    """An object that counts how many times it's printed."""
+    count = 0
+
+    def __repr__(self):
+        Counted.count += 1
+        return "<counted>"
+
+class LogFormatTest(unittest.TestCase):
+    def setUp(self):
+        self.stream = StringIO()
+        self.handler = logging.StreamHandler(self.stream)
+        self.handler.setFormatter(FormatFormatter("%(levelname)s %(message)s"))
+        self.log = logging.getLogger("logformat-test")
+        self.log.propagate = False
+        self.log.setLevel(logging.INFO)
+        self.log.addHandler(self.handler)
+        Counted.count = 0
+
+    def tearDown(self):
+        self.log.removeHandler(self.handler)
+
+    def testFormatter(self):
+        self.log.info("~D item~:P: ~{~A~^, ~}", 3, ["a", "b", "c"])
+        self.log.info("~S", {"x": 1})
+        self.log.warning("plain")
+        self.assertEqual("INFO 3 items: a, b, c\nINFO {'x': 1}\n"
+                         "WARNING plain\n", self.stream.getvalue())
+
+    def testPercentStyle(self):
+        # Messages logged by code that doesn't know about FORMAT.
+        self.log.info("%d item%s", 2, "s")
+        self.log.info("%(n)d ~ %(unit)s", {"n": 3, "unit": "m"})
+        self.log.info("~/%s", "home")
+        self.log.info("~D and ~D")
+        self.assertEqual("INFO 2 items\nINFO 3 ~ m\nINFO ~/home\n"
+                         "INFO ~D and ~D\n", self.stream.getvalue())
+
+    def testLazy(self):
+        self.log.debug("~S", Counted())
+        self.log.debug(FormattedMessage("~S", Counted()))
+        self.assertEqual(0, Counted.count)
+        self.assertEqual("", self.stream.getvalue())
+        self.log.info(FormattedMessage("~S ~S", Counted(), Counted()))
+        self.assertEqual(2, Counted.count)
+        self.assertEqual("INFO <counted> <counted>\n", self.stream.getvalue())
+
+    def testFormattedMessage(self):
+        m = FormattedMessage("~R", 4)
+        self.assertEqual("four", str(m))
+        self.assertEqual("FormattedMessage('~R', 4)", repr(m))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+from __future__ import with_statement
+import random
+import unittest
+from cStringIO import StringIO
+from bindings import bindings
+from charpos import CharposStream
+from format import format, Formatter
+from prettyprinter import PrintStream
+import printervars
+
+class Name(str):
+    def __repr__(self):
+        return "Name(%s)" % str.__repr__(self)
+
+pieces = ["abc", " ", "  ", "%", "%s", "%%d", "\n", "~%", "~~", "~2%",
+          "~A", "~S", "~D"]
+values = ["", "x", "two words", "trailing  ", " \n ", "\n", "\t", "%s",
+          0, -17, 2**70, 1.5, -0.1, 1e100, True, None, u"uni", Name("n"),
+          [1, "a"], (2,), {"k": None}, 3j]
+
+class LoweringTest(unittest.TestCase):
+    def assertSameOutput(self, control, *args):
+        lowered = Formatter(control)
+        general = Formatter(control)
+        general.template = None
+        results = []
+        for f in (lowered, general):
+            try:
+                s = format(None, f, *args)
+            except Exception, e:
+                s = type(e)
+            stream = StringIO()
+            cs = CharposStream(stream, 3)
+            ps = PrintStream(StringIO())
+            try:
+                f(cs, *args)
+                f(ps, *args)
+                results.append((s, stream.getvalue(), cs.charpos,
+                                ps.stream.getvalue(), ps.charpos))
+            except Exception, e:
+                results.append((s, type(e)))
+        self.assertEqual(results[0], results[1],
+                         "%r %r: %r" % (control, args, results))
+
+    def testLowered(self):
+        for control in ("~A", "~S", "~D", "a%s~A%~~~%", "~A ", "~A~%",
+                        "user ~A logged in from ~A~%", "~D%~S ~A  "):
+            f = Formatter(control)
+            self.assertTrue(f.template is not None, control)
+        for control in ("~5A", "~:A", "~@S", "~:D", "~W", "~C", u"a~A",
+                        "~A~T", "~{~A~}"):
+            f = Formatter(control)
+            self.assertTrue(f.template is None, control)
+
+    def testRandom(self):
+        rng = random.Random(42)
+        for i in range(2000):
+            control = "".join([rng.choice(pieces) \
+                                   for j in range(rng.randint(0, 6))])
+            n = Formatter(control).arity
+            args = [rng.choice(values) for j in range(n + rng.randint(0, 1))]
+            self.assertSameOutput(control, *args)
+
+    def testBindings(self):
+        for (name, value) in (("print_string_length", 3),
+                              ("print_lines", 1),
+                              ("print_escape", False)):
+            with bindings(printervars, **{name: value}):
+                for s in ("abcdef", "a\nb\nc"):
+                    self.assertSameOutput("~A ~S~%", s, s)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,17 @@
 from __future__ import with_statement
 import unittest
+from array import array
 from cStringIO import StringIO
 from format import format
 from prettyprinter import *
 from bindings import bindings
 import printervars
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 class PrettyPrinterTest(unittest.TestCase):
     roads = ["Elm", "Cottonwood"]
     town = ["Boston"]
@@ -76,6 +82,33 @@ Main street
 goes to
 Boston.""", 12, "~<~:(~A~) street goes to ~:(~A~).~:@>", ["main", "boston"])
 
+    def testFillNewlines(self):
+        # A fill newline breaks only if the next section won't fit on the
+        # line, so one that follows a break never adds a blank line.
+        for (result, width, control) in \
+                [("aaa bbb\nccc ddd", 8, "~@<aaa ~:_bbb ~:_ccc ~:_ddd~:>"),
+                 ("aaa bbb ccc ddd", 20, "~@<aaa ~:_bbb ~:_ccc ~:_ddd~:>"),
+                 ("aaaaaaaaa\nb", 8, "~@<aaaaaaaaa~_~:_b~:>"),
+                 ("aaa\nbbbbbbbb", 8, "~@<aaa ~:_~:_bbbbbbbb~:>"),
+                 ("aaa\nbbb\nccc", 8, "~@<aaa ~_~:_bbb ~_ccc~:>"),
+                 ("aaa bbb ccc", 20, "~@<aaa ~_~:_bbb ~_ccc~:>")]:
+            self.ppFormatEquals(result, width, control)
+
+    def testFreshLine(self):
+        # Whether ~& is at the beginning of a line depends on the output
+        # before it, even if that's still pending.
+        for (result, width, control) in \
+                [("aaa\nbbb", 20, "~@<aaa~&bbb~:>"),
+                 ("aaa", 20, "~@<~&aaa~:>"),
+                 ("ab\ncd", 20, "ab~@<~&cd~:>"),
+                 ("aaa\nbbb", 20, "~@<aaa~%~&bbb~:>"),
+                 ("aaa\nbbb", 20, "~@<aaa~_~&bbb~:>"),
+                 ("aaa bbb\nccc", 20, "~@<aaa ~_bbb~&ccc~:>"),
+                 ("aaa\nbbb\nccc", 8, "~@<aaa ~_bbb~&ccc~:>"),
+                 ("aaaaaa bbbbbb cc\n", 20, "~@<~&aaaaaa bbbbbb ~_cc~&~:@>"),
+                 ("aaaaaa\nbbbbbb\ncc\n", 8, "~@<~&aaaaaa bbbbbb ~_cc~&~:@>")]:
+            self.ppFormatEquals(result, width, control)
+
     def testIndentation(self):
         control = "~<(~;~A ~:I~A ~:_~A ~1I~_~A~;)~:>"
         defun = ["defun", "prod", "(x y)", "(* x y)"]
@@ -147,5 +180,268 @@ Boston.""", 12, "~<~:(~A~) street goes to ~:(~A~).~:@>", ["main", "boston"])
                 self.assertEqual(levelLengths[(level, length)],
                                  s.replace(",", ""))
 
+    def testArrays(self):
+        a = array("l", range(10))
+        self.ppEquals("array('l', [0, 1, 2, 3, 4, 5, 6, 7, 8, 9])", a)
+        self.ppEquals("array('c', 'abc')", array("c", "abc"))
+        self.ppEquals("""array('l', [0, 1, 2, 3,
+            4, 5, 6, 7,
+            8, 9])""", a, width=24)
+        with bindings(printervars, print_length=3):
+            self.ppEquals("array('l', [0, 1, 2, ...])", a)
+        with bindings(printervars, print_string_length=2,
+                      print_string_tail=1):
+            self.ppEquals("array('c', 'ab'...[2 more chars]...'e')",
+                          array("c", "abcde"))
+            self.ppEquals("array('u', u'ab'...[2 more chars]...u'e')",
+                          array("u", u"abcde"))
+            self.ppEquals("array('c', 'abc')", array("c", "abc"))
+        with bindings(printervars, print_length=3, print_pretty=False):
+            self.ppEquals("memoryview([97, 98, 99, ...], format='B', "
+                          "shape=(4,))", memoryview("abcd"))
+        import ctypes
+        ints = memoryview((ctypes.c_int * 1000)(*range(1000)))
+        with bindings(printervars, print_length=3):
+            self.ppEquals("memoryview([0, 1, 2, ...], format=%r, "
+                          "shape=(1000,))" % ints.format, ints, width=200)
+        matrix = memoryview((ctypes.c_int * 2 * 3)())
+        self.ppEquals("memoryview(..., format=%r, shape=(3, 2))" % \
+                          matrix.format, matrix, width=200)
+        with bindings(printervars, print_level=1):
+            self.ppEquals("[#, #]", [a, memoryview("abcd")])
+
+    def testBytes(self):
+        with bindings(printervars, print_bytes=32):
+            self.ppEquals("""\
+bytearray(00000000  00 01 02 03 04 05 06 07 08 09 0a 0b 0c 0d 0e 0f  |................|
+          00000010  10 11 12 13 14 15 16 17 18 19 1a 1b 1c 1d 1e 1f  |................|
+          ...)""", bytearray(range(256)))
+        with bindings(printervars, print_bytes=0):
+            self.ppEquals("[memoryview(...), bytearray()]",
+                          [memoryview("abc"), bytearray()])
+        with bindings(printervars, print_pretty=False):
+            self.ppEquals("bytearray(b'abc')", bytearray("abc"))
+
+    @unittest.skipUnless(numpy, "requires NumPy")
+    def testNumPyArrays(self):
+        a = numpy.arange(12, dtype=numpy.int32)
+        self.ppEquals("array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11], "
+                      "dtype='int32', shape=(12,))", a, width=200)
+        self.ppEquals("array(5, dtype='int32', shape=())", a[5, ...],
+                      width=200)
+        with bindings(printervars, print_length=2):
+            self.ppEquals("array([[0, 1, ...], [4, 5, ...], ...], "
+                          "dtype='int32', shape=(3, 4))", a.reshape(3, 4),
+                          width=200)
+        self.ppEquals("""array([[0, 1, 2, 3],
+       [4, 5, 6, 7],
+       [8, 9, 10, 11]],
+      dtype='int32',
+      shape=(3, 4))""", a.reshape(3, 4), width=30)
+        with bindings(printervars, print_level=1):
+            self.ppEquals("[#]", [a])
+
+    def testPrintLines(self):
+        a = [(i, "abc") for i in range(10)]
+        lines = ["[(0, 'abc'), ..]",
+                 "[(0, 'abc'),\n (1, 'abc'), ..]",
+                 "[(0, 'abc'),\n (1, 'abc'),\n (2, 'abc'), ..]"]
+        for i in range(1, 4):
+            with bindings(printervars, print_lines=i):
+                self.ppEquals(lines[i-1], a, width=14)
+        with bindings(printervars, print_lines=2):
+            self.ppEquals("[(0,\n  'abc'), ..]", a, width=6)
+            self.assertEqual(format(None, "~<;; ~@;~A~%~A~%~A~:>", (1, 2, 3)),
+                             ";; 1\n;; 2 ..")
+            self.assertEqual(format(None, "~A~%~A~%~A", 1, 2, 3), "1\n2 ..")
+        with bindings(printervars, print_lines=1):
+            self.ppEquals("[(0, 'abc'), (1, 'abc')]", a[:2])
+
+        # The count starts over with each outermost call, and a call cut
+        # short by format returns quietly, just like one by pprint.
+        stringstream = StringIO()
+        with bindings(printervars, print_lines=3):
+            pp = PrettyPrinter(stringstream, width=12)
+            for i in range(3):
+                pp.pprint(range(8))
+                pp.terpri()
+            for i in range(2):
+                format(pp, "~A~%~A~%~A~%~A", 1, 2, 3, 4)
+                pp.terpri()
+        pp.close()
+        self.assertEqual(stringstream.getvalue(),
+                         "[0, 1, 2,\n 3, 4, 5,\n 6, 7]\n" * 3 +
+                         "1\n2\n3 ..\n" * 2)
+
+    def testPrintStringLength(self):
+        s = "ab\ncd" * 10
+        with bindings(printervars, print_string_length=4):
+            self.ppEquals("'ab\\nc'...[46 more chars]", s)
+            self.ppEquals("['abc', 'ab\\nc'...[46 more chars]]", ["abc", s])
+            self.assertEqual(format(None, "~A|~S|~W", s, s, "abcde"),
+                             "ab\nc...[46 more chars]|"
+                             "'ab\\nc'...[46 more chars]|"
+                             "'abcd'...[1 more char]")
+            with bindings(printervars, print_string_tail=3):
+                self.ppEquals("u'ab\\nc'...[43 more chars]...u'\\ncd'",
+                              unicode(s))
+                self.assertEqual(format(None, "~A", s),
+                                 "ab\nc...[43 more chars]...\ncd")
+                self.ppEquals("'abcdefg'", "abcdefg")
+
+    def testPrintStream(self):
+        for (control, args) in (("user ~A logged in from ~A~%", ("x", 1)),
+                                ("~S ~A   ", ("a\nb", None)),
+                                ("~A~10T~A", ("ab", range(30))),
+                                ("~A ~W ~A  ", ("x" * 50, range(20), 2))):
+            stringstream = StringIO()
+            pp = PrettyPrinter(stringstream, width=40)
+            format(pp, control, *args)
+            ps = PrintStream(StringIO())
+            with bindings(printervars, print_right_margin=40):
+                format(ps, control, *args)
+            self.assertEqual(stringstream.getvalue(), ps.stream.getvalue())
+            self.assertEqual(pp.charpos, ps.charpos)
+        ps = PrintStream(StringIO())
+        format(ps, "~A ~S ~D~%", "x", 1.5, 2)
+        self.assertEqual(ps.stream.getvalue(), "x 1.5 2\n")
+        self.assertEqual(ps.pp, None)
+
+    def testNotPretty(self):
+        from collections import deque
+        class Thing(object):
+            def __repr__(self):
+                return "<thing>"
+        obj = [(1,), {"a": [1.5, None, True]}, set(), deque([2], 3), 10L]
+        self.assertEqual(pformat(obj, 10, print_pretty=False),
+                         "[(1,), {'a': [1.5, None, True]}, set([]), "
+                         "deque([2]), 10L]")
+        self.assertEqual(pformat(obj, print_pretty=False, print_length=1,
+                                 print_level=2),
+                         "[(1,), ...]")
+        self.assertEqual(pformat(obj[1:], print_pretty=False, print_level=2),
+                         "[{'a': #}, set([]), deque([2]), 10L]")
+        self.assertEqual(pformat([(1, 2, 3)] * 2, print_pretty=False,
+                                 print_length=1, print_level=2),
+                         "[(1, ...), ...]")
+        self.assertEqual(pformat([["\n", "a\n"], [Thing(), 1]],
+                                 print_pretty=False, print_escape=True),
+                         "[[\n, 'a\\n'], [<thing>, 1]]")
+        self.assertEqual(pformat([["abcdef"], 1.5], print_pretty=False,
+                                 print_escape=False, print_string_length=3),
+                         "[[abc...[3 more chars]], 1.5]")
+
+    def testPformat(self):
+        a = [(i, "abc") for i in range(10)]
+        for width in (10, 40, 80):
+            stringstream = StringIO()
+            pp = PrettyPrinter(stringstream, width=width)
+            with bindings(printervars, print_pretty=True):
+                pp.pprint(a)
+            pp.close()
+            self.assertEqual(stringstream.getvalue(), pformat(a, width))
+        self.assertEqual(pformat(a, print_length=2, print_right_margin=20),
+                         "[(0, 'abc'),\n (1, 'abc'), ...]")
+        self.assertEqual(pformat([a, "x"], print_level=1), "[#, 'x']")
+        self.assertRaises(TypeError, pformat, a, print_lenght=2)
+
+    def testIterPformat(self):
+        a = [(i, "abc" * (i % 5)) for i in range(200)]
+        chunks = list(iter_pformat(a, 40))
+        self.assertEqual("".join(chunks), pformat(a, 40))
+        self.assertTrue(all([c.endswith("\n") for c in chunks[:-1]]))
+        self.assertEqual(len(chunks), pformat(a, 40).count("\n") + 1)
+        self.assertEqual(list(iter_pformat(range(30), print_length=2)),
+                         ["[0, 1, ...]"])
+
+        # Rendering happens only while the consumer waits, and has stopped
+        # by the time it's done closing the generator.
+        class Counted(object):
+            count = 0
+            def __repr__(self):
+                Counted.count += 1
+                return "x"
+        chunks = iter_pformat([Counted()] * 100000, 10)
+        self.assertEqual(chunks.next(), "[x, x, x,\n")
+        count = Counted.count
+        self.assertTrue(count < 10, count)
+        self.assertEqual(pformat([Counted()] * 2), "[x, x]")
+        self.assertEqual(Counted.count, count + 2)
+        chunks.close()
+        self.assertEqual(Counted.count, count + 2)
+
+        # The printer variables are bound only while a chunk is produced,
+        # even if the generators are interleaved.
+        nested = [[[[i]] for i in range(3)]]
+        g1 = iter_pformat(nested, 1, print_level=1)
+        self.assertEqual(g1.next(), "[#]")
+        self.assertEqual(pformat([[1]]), "[[1]]")
+        g2 = iter_pformat(nested, 1, print_level=3)
+        self.assertEqual(g2.next(), "[[[#],\n")
+        with bindings(printervars, print_length=1):
+            self.assertEqual(pformat([[1, 2]]), "[[1, ...]]")
+            self.assertEqual(list(g2), ["  [#],\n", "  [#]]]"])
+            self.assertEqual(printervars.print_length, 1)
+        self.assertEqual(list(g1), [])
+        self.assertEqual(printervars.print_level, None)
+        self.assertEqual(printervars.print_length, None)
+
+        class Broken(object):
+            def __repr__(self):
+                raise ZeroDivisionError
+        self.assertRaises(ZeroDivisionError, list, iter_pformat([1, Broken()]))
+        self.assertRaises(TypeError, iter_pformat, a, print_lenght=2)
+
+    def testStreaming(self):
+        # Elements are consumed one at a time, and the printer only holds
+        # about a line's worth of pending output.
+        stringstream = StringIO()
+        pp = PrettyPrinter(stringstream, width=40)
+        sizes = []
+        def records(n):
+            for i in xrange(n):
+                sizes.append((len(pp.queue), len(pp.scanstack),
+                              stringstream.tell()))
+                yield (i, "abc" * (i % 5))
+        with bindings(printervars, print_pretty=True):
+            with pp.logical_block(records(5000), prefix="[",
+                                  suffix="]") as l:
+                for record in l:
+                    pp.pprint(record)
+                    l.exit_if_list_exhausted()
+                    pp.write(", ")
+                    pp.newline(fill=True)
+        pp.close()
+        output = stringstream.getvalue()
+        self.assertEqual(output, pformat(list(records(5000)), 40))
+        self.assertTrue(max([q for (q, s, n) in sizes[:5000]]) <= 40)
+        self.assertTrue(max([s for (q, s, n) in sizes[:5000]]) <= 2)
+        self.assertTrue(sizes[4999][2] > len(output) - 100)
+
+        # Zero-width tokens are bounded only by print_lookahead, beyond
+        # which the outermost pending blocks are broken.
+        with bindings(printervars, print_lookahead=100):
+            pp = PrettyPrinter(StringIO(), width=40)
+            pp.begin(prefix="(", suffix=")")
+            for i in xrange(5000):
+                pp.begin()
+                pp.newline()
+                pp.end()
+                self.assertTrue(len(pp.queue) <= 101)
+            pp.end()
+            pp.close()
+            pp = PrettyPrinter(StringIO(), width=40)
+            pp.begin()
+            for i in xrange(5000):
+                pp.fresh_line()
+                self.assertTrue(len(pp.queue) <= 101)
+            pp.end()
+            pp.close()
+        with bindings(printervars, print_lookahead=2):
+            self.ppFormatEquals("a\nb\nc", 80, "~<~A ~_~A ~_~A~:>", "abc")
+        self.assertEqual(pformat(range(10), print_lookahead=2),
+                         pformat(range(10)))
+        self.assertRaises(ValueError, pformat, [], print_lookahead=0)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,92 @@
+from __future__ import with_statement
+import os
+import sys
+import tempfile
+from cStringIO import StringIO
+import threading
+import unittest
+from server import Client, FormatServer, ServerError, default_socket, main
+
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "test.sock")
+        self.server = FormatServer(self.path)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        os.rmdir(os.path.dirname(self.path))
+
+    def testSocketMode(self):
+        self.assertEqual(os.stat(self.path).st_mode & 0777, 0600)
+
+    def testRequests(self):
+        with Client(self.path) as client:
+            self.assertEqual(client.format("~D item~:P", 3), "3 items")
+            self.assertEqual(client.format("~{~A~^, ~}", range(3)), "0, 1, 2")
+            self.assertEqual(client.pprint(range(10), print_length=3),
+                             "[0, 1, 2, ...]")
+            self.assertEqual(client.pprint(range(10), width=10),
+                             "[0, 1, 2,\n 3, 4, 5,\n 6, 7, 8,\n 9]")
+            self.assertRaises(ServerError, client.format, "~D~D", 1)
+            self.assertRaises(ServerError, client.format, "~A", 1,
+                              print_nonsense=True)
+            self.assertEqual(client.format("~A", "still alive"),
+                             "still alive")
+
+    def testStreaming(self):
+        big = range(100000)
+        with Client(self.path) as client:
+            chunks = list(client.iter_pprint(big, print_pretty=False))
+            self.assertTrue(len(chunks) > 1)
+            self.assertEqual("".join(chunks), str(big))
+
+    def testStalledClient(self):
+        # A client that stops reading its output doesn't hold up others.
+        with Client(self.path) as stalled:
+            chunks = stalled.iter_pprint(range(1000000), print_pretty=False)
+            chunks.next()
+            with Client(self.path) as client:
+                client.sock.settimeout(10)
+                self.assertEqual(client.format("~D", 1), "1")
+
+    def testSafety(self):
+        directory = os.path.dirname(self.path)
+        other = os.path.join(directory, "other")
+        with open(other, "w") as f:
+            f.write("not a socket")
+        self.assertRaises(OSError, FormatServer, other)
+        self.assertRaises(OSError, Client, other)
+        self.assertEqual(open(other).read(), "not a socket")
+        os.unlink(other)
+
+        saved = os.environ.get("XDG_RUNTIME_DIR")
+        os.environ["XDG_RUNTIME_DIR"] = directory
+        try:
+            # Asking for help doesn't create the runtime directory.
+            (sys.stdout, stdout) = (StringIO(), sys.stdout)
+            try:
+                self.assertRaises(SystemExit, main, ["--help"])
+            finally:
+                sys.stdout = stdout
+            self.assertFalse(os.path.exists(os.path.join(directory,
+                                                         "prettyprinter")))
+            path = default_socket()
+            self.assertEqual(os.path.dirname(path),
+                             os.path.join(directory, "prettyprinter"))
+            self.assertEqual(os.stat(os.path.dirname(path)).st_mode & 0777,
+                             0700)
+            os.chmod(os.path.dirname(path), 0755)
+            self.assertRaises(OSError, default_socket)
+            os.rmdir(os.path.dirname(path))
+        finally:
+            if saved is None:
+                del os.environ["XDG_RUNTIME_DIR"]
+            else:
+                os.environ["XDG_RUNTIME_DIR"] = saved
+
+if __name__ == "__main__":
+    unittest.main()
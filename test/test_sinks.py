@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+from prettyprinter import PrettyPrinter
+from sinks import FileDescriptorStream, MmapStream, StringSink
+
+class SinkTest(unittest.TestCase):
+    obj = [dict((i, range(i)) for i in range(30)), u"caf\xe9", ("x",) * 50]
+
+    def setUp(self):
+        (fd, self.filename) = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def expected(self):
+        with open(self.filename, "w") as f:
+            pp = PrettyPrinter(f, width=40)
+            pp.pprint(self.obj)
+            pp.close()
+        with open(self.filename) as f:
+            return f.read()
+
+    def written(self, stream):
+        pp = PrettyPrinter(stream, width=40)
+        pp.pprint(self.obj)
+        pp.close()
+        stream.close()
+        with open(self.filename) as f:
+            return f.read()
+
+    def testFileDescriptorStream(self):
+        expected = self.expected()
+        for batch_size in (1, 100, 1 << 16):
+            stream = FileDescriptorStream.open(self.filename,
+                                               batch_size=batch_size)
+            self.assertEqual(expected, self.written(stream))
+
+    def testMmapStream(self):
+        expected = self.expected()
+        for size in (1, 1 << 20):
+            stream = MmapStream(self.filename, size=size)
+            self.assertEqual(expected, self.written(stream))
+            self.assertEqual(len(expected), os.path.getsize(self.filename))
+
+    def testUnicode(self):
+        for cls in (FileDescriptorStream.open, MmapStream):
+            stream = cls(self.filename)
+            stream.write("caf")
+            stream.write(u"\xe9")
+            stream.close()
+            with open(self.filename) as f:
+                self.assertEqual("caf\xc3\xa9", f.read())
+        for cls in (FileDescriptorStream.open, MmapStream):
+            stream = cls(self.filename)
+            stream.write("caf\xc3\xa9")
+            stream.write(u"\xe9")
+            stream.close()
+            with open(self.filename) as f:
+                self.assertEqual("caf\xc3\xa9\xc3\xa9", f.read())
+
+    def testFailedFlush(self):
+        # A batch that can't be written is kept, not dropped.
+        (r, w) = os.pipe()
+        stream = FileDescriptorStream(r)
+        stream.write("abc")
+        stream.write(u"\xe9")
+        self.assertRaises(OSError, stream.flush)
+        stream.fd = w
+        stream.close()
+        os.close(w)
+        self.assertEqual("abc\xc3\xa9", os.read(r, 100))
+        os.close(r)
+
+    def testStringSink(self):
+        expected = self.expected()
+        sink = StringSink()
+        pp = PrettyPrinter(sink, width=40)
+        pp.pprint(self.obj)
+        pp.close()
+        self.assertEqual(expected.decode("utf-8"), sink.getvalue())
+        self.assertEqual(len(expected.split("\n")[-1]), sink.charpos)
+        sink.write("ab\ncd")
+        sink.write("ef")
+        self.assertEqual(4, sink.charpos)
+        self.assertEqual("", StringSink().getvalue())
+        sink = StringSink()
+        sink.write("caf\xc3\xa9")
+        sink.write(u"\xe9")
+        self.assertEqual("caf\xc3\xa9\xc3\xa9", sink.getvalue())
+        sink = StringSink(encoding="latin-1")
+        sink.write("caf\xe9")
+        sink.write(u"\xe9")
+        self.assertEqual("caf\xe9\xe9", sink.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+from __future__ import with_statement
+import unittest
+from collections import namedtuple
+from bindings import bindings
+from format import format
+from structural import structural_printer, fields
+import printervars
+
+Point = structural_printer(namedtuple("Point", "x y"))
+
+@structural_printer
+class Segment(object):
+    __slots__ = ("start", "end")
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+class Circle(object):
+    def __init__(self, center, radius):
+        self.center = center
+        self.radius = radius
+        self.area = 3.14 * radius ** 2
+
+structural_printer(Circle, ["center", "radius"])
+
+class Labeled(Segment):
+    __slots__ = ("__label",)
+
+    def __init__(self, start, end, label):
+        super(Labeled, self).__init__(start, end)
+        self.__label = label
+
+class Sublabeled(Labeled):
+    __slots__ = ("weight",)
+
+    def __init__(self, start, end, label, weight):
+        super(Sublabeled, self).__init__(start, end, label)
+        self.weight = weight
+
+class Statement(object):
+    __slots__ = ("pass", "x")
+
+class StructuralTest(unittest.TestCase):
+    def testFields(self):
+        self.assertEqual(fields(Point), ["x", "y"])
+        self.assertEqual(fields(Labeled), ["start", "end", "__label"])
+        self.assertRaises(TypeError, fields, Circle)
+
+    def testPrinters(self):
+        s = Segment(Point(0, 0), Point(3, 4))
+        self.assertEqual(format(None, "~W", s),
+                         "Segment(start=Point(x=0, y=0), end=Point(x=3, y=4))")
+        self.assertEqual(format(None, "~W", Circle(Point(1, 1), 2)),
+                         "Circle(center=Point(x=1, y=1), radius=2)")
+        structural_printer(Labeled)
+        self.assertEqual(format(None, "~W", Labeled(1, 2, "a")),
+                         "Labeled(start=1, end=2, __label='a')")
+        structural_printer(Statement)
+        statement = Statement()
+        setattr(statement, "pass", 1)
+        statement.x = 2
+        self.assertEqual(format(None, "~W", statement),
+                         "Statement(pass=1, x=2)")
+        structural_printer(Circle, ["center", "from"])
+        circle = Circle(0, 1)
+        setattr(circle, "from", "o")
+        self.assertEqual(format(None, "~W", circle),
+                         "Circle(center=0, from='o')")
+        structural_printer(Circle, ["center", "radius"])
+        structural_printer(Sublabeled)
+        self.assertEqual(format(None, "~W", Sublabeled(1, 2, "a", 3)),
+                         "Sublabeled(start=1, end=2, __label='a', weight=3)")
+        self.assertEqual(format(None, "~A", Point("a", "b")),
+                         "Point(x=a, y=b)")
+
+    def testLayout(self):
+        with bindings(printervars, print_right_margin=30):
+            self.assertEqual(format(None, "~W",
+                                    Segment(Point(10, 20), Point(30, 40))),
+                             """\
+Segment(start=Point(x=10,
+                    y=20),
+        end=Point(x=30, y=40))""")
+
+    def testLimits(self):
+        s = Segment(Point(0, 0), Point(3, 4))
+        with bindings(printervars, print_length=1):
+            self.assertEqual(format(None, "~W", s),
+                             "Segment(start=Point(x=0, ...), ...)")
+        with bindings(printervars, print_level=1):
+            self.assertEqual(format(None, "~W", s),
+                             "Segment(start=#, end=#)")
+        with bindings(printervars, print_length=0, print_level=0):
+            self.assertEqual(format(None, "~W", s), "#")
+
+if __name__ == "__main__":
+    unittest.main()
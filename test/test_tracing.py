@@ -0,0 +1,102 @@
+from __future__ import with_statement
+import unittest
+from collections import namedtuple
+from bindings import bindings
+from cStringIO import StringIO
+from prettyprinter import PrettyPrinter, pformat
+import prettyprinter
+from structural import structural_printer
+from tracing import Trace
+import printervars
+
+Job = structural_printer(namedtuple("Job", "name config"))
+
+class TracingTest(unittest.TestCase):
+    data = {"jobs": [Job("a", {"args": [1, 2]}), Job("b", None)], "n": 2}
+
+    def traced(self, trace, obj, width=40):
+        with bindings(printervars, print_trace=trace):
+            return pformat(obj, width)
+
+    def testOutput(self):
+        trace = Trace()
+        self.assertEqual(self.traced(trace, self.data),
+                         pformat(self.data, 40))
+        self.assertEqual(trace.pp, None)
+        self.assertEqual(self.traced(Trace(rate=0), self.data),
+                         pformat(self.data, 40))
+
+    def testCounts(self):
+        trace = Trace(top=100)
+        s = self.traced(trace, self.data, width=200)
+        self.assertEqual(trace.calls, 1)
+        counts = dict([(t, stats[0]) for (t, stats) in trace.types.items()])
+        self.assertEqual(counts, {dict: 2, list: 2, Job: 2, str: 5, int: 3,
+                                  type(None): 1})
+        self.assertEqual(trace.chars, len(s))
+        self.assertEqual(sum([stats[2] for stats in trace.types.values()]),
+                         len(s))
+        top = trace.top_subtrees()
+        self.assertEqual(top[0][1:], ("root", "dict", trace.chars, 15))
+        self.assertEqual(set([path for (_, path, _, _, _) in top]),
+                         set(["root", "root.keys()[0]", "root.keys()[1]",
+                              "root['jobs']", "root['n']",
+                              "root['jobs'][0]", "root['jobs'][1]",
+                              "root['jobs'][0].name",
+                              "root['jobs'][0].config",
+                              "root['jobs'][0].config.keys()[0]",
+                              "root['jobs'][0].config['args']",
+                              "root['jobs'][0].config['args'][0]",
+                              "root['jobs'][0].config['args'][1]",
+                              "root['jobs'][1].name",
+                              "root['jobs'][1].config"]))
+        self.assertEqual(len(Trace(top=3).subtrees), 0)
+
+    def testFlat(self):
+        # Only sampled calls give up printing builtin subtrees flat.
+        flat = []
+        def flat_repr(obj, level, flat_repr=prettyprinter.flat_repr):
+            flat.append(obj)
+            return flat_repr(obj, level)
+        def printed(trace):
+            stream = StringIO()
+            with bindings(printervars, print_pretty=False, print_trace=trace):
+                PrettyPrinter(stream).pprint(self.data)
+            return stream.getvalue()
+        prettyprinter.flat_repr = flat_repr
+        try:
+            expected = printed(None)
+            n = len(flat)
+            self.assertTrue(n > 0)
+            self.assertEqual(printed(Trace(rate=0)), expected)
+            self.assertEqual(len(flat), 2 * n)
+            trace = Trace()
+            self.assertEqual(printed(trace), expected)
+            self.assertEqual(len(flat), 2 * n)
+            self.assertEqual(trace.types[int][0], 3)
+        finally:
+            prettyprinter.flat_repr = flat_repr.func_defaults[0]
+
+    def testCallbacks(self):
+        events = []
+        trace = Trace(begin=lambda t: events.append(("begin", t.path())),
+                      end=lambda t: events.append(("end", t.path())))
+        self.traced(trace, [Job("x", [1])])
+        self.assertEqual(events, [("begin", "root"),
+                                  ("begin", "root[0]"),
+                                  ("begin", "root[0].config"),
+                                  ("end", "root[0].config"),
+                                  ("end", "root[0]"),
+                                  ("end", "root")])
+
+    def testReport(self):
+        trace = Trace(rate=0)
+        self.traced(trace, self.data)
+        self.assertEqual(trace.report().splitlines()[0], "0 calls traced")
+        trace = Trace()
+        self.traced(trace, self.data)
+        report = trace.report()
+        self.assertTrue("root['jobs'][0].config (dict)" in report, report)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,18 +4,106 @@ import timeit
 setup = """
 import pprint
 import prettyprinter as pp
-from format import format, parse_control_string
+from format import format, format_many, parse_control_string
 
 null = open("/dev/null", "w")
+import os
+import tempfile
+temp = tempfile.mkdtemp()
+out = os.path.join(temp, "timing.out")
 tupler = "(~{~A,~^ ~@{~A~^, ~}~})"
+report = "Host ~A~20T~:[down~;up~] since ~{~A~^, ~} [~5,'0D]~%" * 3000
 l = tuple(xrange(1000))
 d = dict(zip(range(100), range(100, 200)))
+numbers = range(-5000, 5000)
+big = 10**100000 - 1
+from sinks import FileDescriptorStream, MmapStream
+rows = [("user%d" % i, i, i * 0.5) for i in range(1000)]
+def format_loop(control, rows):
+    for row in rows:
+        format(null, control, *row)
+fragments = ["abcdefgh", "  ", "[1, 2, 3]", "\\n"] * 10000
+from collections import namedtuple
+from structural import structural_printer
+Point = namedtuple("Point", "x y z")
+points = [Point(i, -i, i * i) for i in range(300)]
+Spot = structural_printer(namedtuple("Spot", "x y z"))
+spots = [Spot(i, -i, i * i) for i in range(300)]
+from cStringIO import StringIO
+from bindings import bindings
+import printervars
+def pformat_stringio(obj):
+    s = StringIO()
+    p = pp.PrettyPrinter(s)
+    with bindings(printervars, print_pretty=True):
+        p.pprint(obj)
+    p.close()
+    return s.getvalue()
+nested = [{"id": i, "tags": ("a", "b"), "scores": [i, i * 0.5]}
+          for i in range(300)]
+def pformat_flat(obj):
+    with bindings(printervars, print_pretty=False):
+        p = pp.PrettyPrinter(null)
+        p.pprint(obj)
+        p.close()
+from tracing import Trace
+def pformat_traced(obj, rate):
+    with bindings(printervars, print_trace=Trace(rate=rate)):
+        return pp.pformat(obj)
+import format as format_module
+from formatcache import prewarm
+controls = ["~A~20T~:[down~;up~] ~{~A~^, ~} [~5,'0D] ~D~%" + str(i)
+            for i in range(3000)]
+def parse_all():
+    format_module.formatters.clear()
+    for control in controls:
+        format_module.formatter(control)
+def prewarm_all(path=os.path.join(temp, "timing.cache")):
+    format_module.formatters.clear()
+    format_module.pickled_formatters.clear()
+    prewarm(controls, path)
+prewarm_all()
+def dump(stream):
+    write = stream.write
+    for s in fragments:
+        write(s)
+    stream.close()
 """[1:]
 stmts = (("parse", """tuple(parse_control_string(tupler))"""),
+         ("parse report template", """parse_control_string(report)"""),
+         ("parse 3000 control strings", """parse_all()"""),
+         ("prewarm 3000 control strings", """prewarm_all()"""),
          ("format", """format(null, "~~foo: ~D pon~:@P~%", 3)"""),
+         ("log line", """format(null, "user ~A logged in from ~A~%", "bob", 7)"""),
+         ("rows loop", """format_loop("~A,~D,~S~%", rows)"""),
+         ("rows format_many", """format_many(null, "~A,~D,~S~%", rows)"""),
+         ("padded rows loop", """format_loop("~10A ~5D ~S~%", rows)"""),
+         ("padded rows format_many",
+          """format_many(null, "~10A ~5D ~S~%", rows)"""),
          ("iteration", """format(null, tupler, l)"""),
+         ("short iteration", """format(null, "~{~A~^, ~}", ("a", "b"))"""),
+         ("short outer escape",
+          """format(null, "~:{~A=~A~:^, ~}", [("a", 1), ("b", 2)])"""),
+         ("numeric iteration", """format(null, "~{~:D~^, ~}", numbers)"""),
+         ("bignum radix 7", """format(null, "~7R", big)"""),
+         ("bignum binary", """format(null, "~,,' ,4:B", big)"""),
+         ("bignum decimal", """format(null, "~:D", big)"""),
+         ("bignum cardinal", """format(null, "~R", big)"""),
          ("prettyprinter", """pp.pprint(l, stream=null)"""),
-         ("pprint", """pprint.pprint(l, null)"""))
+         ("pprint", """pprint.pprint(l, null)"""),
+         ("prettyprinter not pretty", """pformat_flat(nested)"""),
+         ("repr", """repr(nested)"""),
+         ("pformat via StringIO", """pformat_stringio(d)"""),
+         ("pformat", """pp.pformat(d)"""),
+         ("iter_pformat", """"".join(pp.iter_pformat(d))"""),
+         ("iter_pformat first line", """pp.iter_pformat(l).next()"""),
+         ("pformat traced 1%", """pformat_traced(d, 0.01)"""),
+         ("pformat traced", """pformat_traced(d, 1.0)"""),
+         ("namedtuple repr", """pp.pprint(points, stream=null)"""),
+         ("namedtuple structural", """pp.pprint(spots, stream=null)"""),
+         ("file sink", """dump(open(out, "w"))"""),
+         ("fd sink", """dump(FileDescriptorStream.open(out))"""),
+         ("mmap sink", """dump(MmapStream(out))"""))
 for name, stmt in stmts:
     print ">> %s" % name
     timeit.main(["-s", setup, stmt])
@@ -0,0 +1,60 @@
+"""Latency and throughput of the formatting server, compared with
+formatting in-process and with starting a fresh process per message."""
+
+from __future__ import with_statement
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from format import format
+from server import Client, FormatServer
+
+def best(f, n, repeat=3):
+    """Return the best average time per call of f over repeat runs of n."""
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        for j in xrange(n):
+            f()
+        times.append((time.time() - start) / n)
+    return min(times)
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), "timing.sock")
+    server = FormatServer(path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    control = "~~foo: ~D pon~:@P~%"
+    big = range(200000)
+    try:
+        with Client(path) as client:
+            print ">> latency"
+            print "in-process: %8.1f usec" % \
+                (1e6 * best(lambda: format(None, control, 3), 10000))
+            print "server:     %8.1f usec" % \
+                (1e6 * best(lambda: client.format(control, 3), 2000))
+            python = [sys.executable, "-c",
+                      "from format import format; format(None, %r, 3)" % \
+                          control]
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+            print "new process:%8.1f usec" % \
+                (1e6 * best(lambda: subprocess.call(python, env=env), 20))
+            print
+            print ">> throughput (pprint of %d integers)" % len(big)
+            for (name, f) in (("in-process",
+                               lambda: format(None, "~W", big)),
+                              ("server",
+                               lambda: client.pprint(big, width=80))):
+                t = best(f, 3)
+                size = len(f())
+                print "%-11s %8.1f MB/s" % (name + ":", size / t / 1e6)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+        os.rmdir(os.path.dirname(path))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Startup time of the format and prettyprinter modules.
+
+Python 2 has no -X importtime, so this does the same job by hand: each
+module is imported in a fresh interpreter with __import__ wrapped to
+record the self and cumulative time of every import, in the format of
+-X importtime, and the median wall-clock time of starting an interpreter
+and importing (or using) each module is reported."""
+
+import os
+import subprocess
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+env = dict(os.environ, PYTHONPATH=os.path.dirname(here))
+
+importtime = r"""
+import sys, __builtin__
+from time import time
+real_import = __builtin__.__import__
+stack = [0.0]
+log = []
+def timed_import(name, globals=None, locals=None, fromlist=None, level=-1):
+    if name in sys.modules:
+        return real_import(name, globals, locals, fromlist, level)
+    stack.append(0.0)
+    start = time()
+    try:
+        return real_import(name, globals, locals, fromlist, level)
+    finally:
+        total = time() - start
+        children = stack.pop()
+        stack[-1] += total
+        log.append((len(stack) - 1, name, total - children, total))
+__builtin__.__import__ = timed_import
+%s
+__builtin__.__import__ = real_import
+sys.stderr.write("import time: self [us] | cumulative | imported package\n")
+for (depth, name, self, total) in log:
+    sys.stderr.write("import time: %%9d | %%10d | %%s%%s\n" %% \
+                         (self * 1e6, total * 1e6, "  " * depth, name))
+"""
+
+def median_time(code, n=20):
+    """Return the median wall-clock time of running code in a fresh
+    interpreter."""
+    from time import time
+    times = []
+    for i in range(n):
+        start = time()
+        subprocess.check_call([sys.executable, "-c", code], env=env)
+        times.append(time() - start)
+    times.sort()
+    return times[n // 2]
+
+def main():
+    statements = [("python", "pass"),
+                  ("import charpos", "import charpos"),
+                  ("import prettyprinter", "import prettyprinter"),
+                  ("import format", "import format"),
+                  ("format a log line",
+                   "from format import format; "
+                   "format(None, 'user ~A logged in from ~A~%', 'bob', 7)"),
+                  ("pformat a dict",
+                   "from prettyprinter import pformat; "
+                   "pformat(dict(zip(range(100), range(100))))")]
+    for (name, code) in statements:
+        print ">> %s" % name
+        print "%8.2f msec" % (1e3 * median_time(code))
+        print
+    for module in ("prettyprinter", "format"):
+        print ">> import %s (per module)" % module
+        sys.stdout.flush()
+        subprocess.check_call([sys.executable, "-c",
+                               importtime % ("import %s" % module)],
+                              env=env, stderr=sys.stdout)
+        print
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Find out where the time goes when pretty-printing.
+
+A trace is installed by binding printervars.print_trace, e.g.,
+
+    trace = Trace(top=10, rate=0.01)
+    with bindings(printervars, print_trace=trace):
+        ...
+    print trace.report()
+
+The given fraction of top-level pprint calls are traced.  For each type,
+a trace records the number of objects printed and the time taken and
+characters written by them, excluding their elements; for the top most
+expensive subtrees, the same things including their elements, along with
+a path like root["jobs"][17].config that identifies the subtree.  Fields
+of objects with structural printers are shown as attributes; elements of
+other objects by index, and dictionary values by key.  The characters
+counted are the ones written by printers and the prefixes and suffixes of
+logical blocks, not the line breaks and indentation.
+
+The optional begin and end callbacks are called with the trace as their
+argument just after a logical block begins and just before it ends; they
+might, e.g., sample the current path (see Trace.path)."""
+
+import heapq
+from random import random
+from timeit import default_timer as timer
+from format import format
+from prettyprinter import PrettyPrinter, printers
+
+__all__ = ["Trace"]
+
+class Frame(object):
+    """An object being traced."""
+
+    __slots__ = ("obj", "parent", "index", "key",
+                 "children", "last", "seconds", "chars")
+
+    def __init__(self, obj, parent, index, key):
+        self.obj = obj
+        self.parent = parent
+        self.index = index      # position among the parent's elements
+        self.key = key          # dictionary key, for dictionary values
+        self.children = 0
+        self.last = None        # the last element printed
+        self.seconds = 0.0      # total time taken by elements
+        self.chars = 0          # total characters written by elements
+
+    def step(self):
+        """Return the part of a path that leads from the parent to here."""
+        parent = self.parent.obj
+        if isinstance(parent, dict):
+            if self.index % 2:
+                return "[%r]" % (self.key,)
+            else:
+                return ".keys()[%d]" % (self.index // 2)
+        fields = getattr(printers.get(type(parent)), "fields", None)
+        if fields and self.index < len(fields):
+            return ".%s" % fields[self.index]
+        return "[%d]" % self.index
+
+class Trace(object):
+    def __init__(self, top=10, rate=1.0, begin=None, end=None):
+        """Trace the given fraction of top-level pprint calls, keeping the
+        top most expensive subtrees, and calling begin and end around
+        logical blocks."""
+        self.top = top
+        self.rate = rate
+        self.on_begin = begin
+        self.on_end = end
+        self.pp = None          # the printer being traced, if any
+        self.frame = None
+        self.calls = 0          # number of calls traced
+        self.chars = 0
+        self.types = {}         # type -> [count, seconds, chars]
+        self.subtrees = []      # heap of (seconds, path, type, chars, nodes)
+        self.nodes = 0
+
+    def pprint(self, pp, obj):
+        """Pretty-print obj on pp, tracing if this call is sampled."""
+        self.pp = pp
+        try:
+            if random() >= self.rate:
+                pp.pprint(obj)
+                return
+            self.calls += 1
+            pp.pprint = self.node
+            pp.write = self.write
+            pp.begin = self.begin
+            pp.end = self.end
+            self.frame = Frame(None, None, 0, None)
+            try:
+                self.node(obj)
+            finally:
+                del pp.pprint, pp.write, pp.begin, pp.end
+                self.frame = None
+        finally:
+            self.pp = None
+
+    def node(self, obj):
+        parent = self.frame
+        frame = Frame(obj, parent, parent.children,
+                      parent.last if isinstance(parent.obj, dict) else None)
+        parent.children += 1
+        parent.last = obj
+        self.frame = frame
+        chars = self.chars
+        nodes = self.nodes
+        self.nodes += 1
+        start = timer()
+        try:
+            PrettyPrinter.pprint(self.pp, obj)
+        finally:
+            seconds = timer() - start
+            chars = self.chars - chars
+            self.frame = parent
+            parent.seconds += seconds
+            parent.chars += chars
+            stats = self.types.get(type(obj))
+            if stats is None:
+                stats = self.types[type(obj)] = [0, 0.0, 0]
+            stats[0] += 1
+            stats[1] += seconds - frame.seconds
+            stats[2] += chars - frame.chars
+            subtrees = self.subtrees
+            if len(subtrees) < self.top or seconds > subtrees[0][0]:
+                entry = (seconds, self.path(frame), type(obj).__name__,
+                         chars, self.nodes - nodes)
+                if len(subtrees) < self.top:
+                    heapq.heappush(subtrees, entry)
+                else:
+                    heapq.heapreplace(subtrees, entry)
+
+    def write(self, string):
+        self.chars += len(string)
+        PrettyPrinter.write(self.pp, string)
+
+    def begin(self, *args, **kwargs):
+        PrettyPrinter.begin(self.pp, *args, **kwargs)
+        self.chars += len(self.pp.queue[-1].prefix)
+        if self.on_begin:
+            self.on_begin(self)
+
+    def end(self, suffix=""):
+        if self.on_end:
+            self.on_end(self)
+        self.chars += len(suffix)
+        PrettyPrinter.end(self.pp, suffix=suffix)
+
+    def path(self, frame=None):
+        """Return the path of the given frame (by default, the object
+        currently being printed) from the root object."""
+        frame = frame or self.frame
+        steps = []
+        while frame.parent and frame.parent.parent:
+            steps.append(frame.step())
+            frame = frame.parent
+        steps.append("root")
+        return "".join(reversed(steps))
+
+    def top_subtrees(self):
+        """Return a list of (seconds, path, type name, chars, nodes) tuples
+        for the most expensive subtrees, most expensive first."""
+        return sorted(self.subtrees, reverse=True)
+
+    def report(self):
+        """Return a printable summary of the trace."""
+        types = sorted([(stats[1], t.__name__, stats[0], stats[2]) \
+                            for (t, stats) in self.types.items()],
+                       reverse=True)
+        return format(None, "~D call~:P traced~%"
+                      "~%~20A ~10@A ~10@A ~10@A~%"
+                      "~:{~20A ~10@A ~10D ~10D~%~}"
+                      "~%~10@A ~10@A ~10@A  ~A~%"
+                      "~:{~10@A ~10D ~10D  ~A (~A)~%~}",
+                      self.calls,
+                      "type", "seconds", "count", "chars",
+                      [(name, "%.6f" % seconds, count, chars) \
+                           for (seconds, name, count, chars) in types],
+                      "seconds", "nodes", "chars", "path",
+                      [("%.6f" % seconds, nodes, chars, path, name) \
+                           for (seconds, path, name, chars, nodes) \
+                               in self.top_subtrees()])